@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""Minimal MQTT 3.1.1 broker stand-in for benchmarks and local testing.
+
+Supports CONNECT (incl. last will), PUBLISH with QoS 0/1/2, retained messages,
+SUBSCRIBE/UNSUBSCRIBE with + and # wildcards (delivery at QoS 0), PINGREQ and
+DISCONNECT. It counts every received publish and can log them as JSON lines.
+Not meant for production use.
+"""
+
+import argparse
+import asyncio
+import json
+import struct
+import sys
+from time import time
+
+
+def topic_matches(subscription, topic):
+    sub_levels = subscription.split('/')
+    topic_levels = topic.split('/')
+    for index, level in enumerate(sub_levels):
+        if level == '#':
+            return True
+        if index >= len(topic_levels):
+            return False
+        if level != '+' and level != topic_levels[index]:
+            return False
+    return len(sub_levels) == len(topic_levels)
+
+
+def encode_length(length):
+    encoded = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            byte |= 0x80
+        encoded.append(byte)
+        if not length:
+            return bytes(encoded)
+
+
+def encode_string(value):
+    return struct.pack('!H', len(value)) + value
+
+
+def publish_packet(topic, payload, retain=False):
+    body = encode_string(topic.encode()) + payload
+    return bytes([0x30 | (1 if retain else 0)]) + encode_length(len(body)) + body
+
+
+class Broker:
+    def __init__(self, log=None):
+        self.retained = dict()
+        self.sessions = set()
+        self.publishes = 0
+        self.payload_bytes = 0
+        self.first_publish = None
+        self.last_publish = None
+        self.log = log
+
+    def stats(self):
+        return dict(publishes=self.publishes, payload_bytes=self.payload_bytes, first_publish=self.first_publish,
+                    last_publish=self.last_publish, retained=len(self.retained), clients=len(self.sessions))
+
+    def route(self, topic, payload, retain, origin=None):
+        now = time()
+        if origin is not None:
+            self.publishes += 1
+            self.payload_bytes += len(payload)
+            self.first_publish = self.first_publish or now
+            self.last_publish = now
+            if self.log:
+                self.log.write(json.dumps(dict(ts=now, client=origin.client_id, topic=topic, retain=retain,
+                                               payload=payload.decode('utf-8', 'replace'))) + '\n')
+                self.log.flush()
+        if retain:
+            if payload:
+                self.retained[topic] = payload
+            else:
+                self.retained.pop(topic, None)
+        for session in list(self.sessions):
+            if any(topic_matches(subscription, topic) for subscription in session.subscriptions):
+                session.send(publish_packet(topic, payload))
+
+    async def handle(self, reader, writer):
+        session = Session(self, writer)
+        try:
+            while True:
+                header = await reader.readexactly(1)
+                length, multiplier = 0, 1
+                while True:
+                    byte = (await reader.readexactly(1))[0]
+                    length += (byte & 0x7f) * multiplier
+                    multiplier *= 128
+                    if not byte & 0x80:
+                        break
+                body = await reader.readexactly(length) if length else b''
+                if not session.packet(header[0], body):
+                    session.will = None
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.sessions.discard(session)
+            if session.will:
+                self.route(*session.will, origin=session)
+            writer.close()
+
+
+class Session:
+    def __init__(self, broker, writer):
+        self.broker = broker
+        self.writer = writer
+        self.client_id = None
+        self.subscriptions = set()
+        self.will = None
+
+    def send(self, data):
+        self.writer.write(data)
+
+    def packet(self, header, body):
+        kind = header >> 4
+        if kind == 1:  # CONNECT
+            protocol_length, = struct.unpack('!H', body[:2])
+            offset = 2 + protocol_length + 1
+            flags = body[offset]
+            offset += 3
+            fields = []
+            while offset < len(body):
+                field_length, = struct.unpack('!H', body[offset:offset + 2])
+                fields.append(body[offset + 2:offset + 2 + field_length])
+                offset += 2 + field_length
+            self.client_id = fields[0].decode()
+            if flags & 0x04:
+                self.will = (fields[1].decode(), fields[2], bool(flags & 0x20))
+            self.broker.sessions.add(self)
+            self.send(b'\x20\x02\x00\x00')
+        elif kind == 3:  # PUBLISH
+            qos = (header >> 1) & 0x03
+            topic_length, = struct.unpack('!H', body[:2])
+            topic = body[2:2 + topic_length].decode()
+            offset = 2 + topic_length
+            if qos:
+                mid = body[offset:offset + 2]
+                offset += 2
+                self.send((b'\x40\x02' if qos == 1 else b'\x50\x02') + mid)
+            self.broker.route(topic, body[offset:], bool(header & 0x01), origin=self)
+        elif kind == 6:  # PUBREL
+            self.send(b'\x70\x02' + body[:2])
+        elif kind == 8:  # SUBSCRIBE
+            mid, offset, granted = body[:2], 2, bytearray()
+            subscribed = []
+            while offset < len(body):
+                topic_length, = struct.unpack('!H', body[offset:offset + 2])
+                subscribed.append(body[offset + 2:offset + 2 + topic_length].decode())
+                offset += 2 + topic_length + 1
+                granted.append(0)
+            self.subscriptions.update(subscribed)
+            self.send(b'\x90' + encode_length(2 + len(granted)) + mid + bytes(granted))
+            for [topic, payload] in list(self.broker.retained.items()):
+                if any(topic_matches(subscription, topic) for subscription in subscribed):
+                    self.send(publish_packet(topic, payload, retain=True))
+        elif kind == 10:  # UNSUBSCRIBE
+            offset = 2
+            while offset < len(body):
+                topic_length, = struct.unpack('!H', body[offset:offset + 2])
+                self.subscriptions.discard(body[offset + 2:offset + 2 + topic_length].decode())
+                offset += 2 + topic_length
+            self.send(b'\xb0\x02' + body[:2])
+        elif kind == 12:  # PINGREQ
+            self.send(b'\xd0\x00')
+        elif kind == 14:  # DISCONNECT
+            return False
+        return True
+
+
+async def serve(host, port, broker, ready=None):
+    server = await asyncio.start_server(broker.handle, host, port)
+    if ready is not None:
+        ready(server.sockets[0].getsockname()[1])
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Minimal MQTT broker stand-in')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1883)
+    parser.add_argument('--log', help='append every received publish as a JSON line to this file')
+    args = parser.parse_args()
+    log = open(args.log, 'a') if args.log else None
+    try:
+        asyncio.run(serve(args.host, args.port, Broker(log), ready=lambda port: print('Listening on port {}'.format(port), file=sys.stderr)))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""Benchmark of the daemon against simulated sensors and the local MQTT broker stand-in.
+
+For every fleet size a fresh configuration with that many virtual sensors ("backend = simulated")
+is written and the daemon polls all of them once in non-daemon mode, publishing via mqtt-json.
+Reported per run:
+    startup      process start until the discovery announcement reached the broker
+    cycle        discovery announcement until the last sensor reading reached the broker
+    publishes/s  sensor readings received by the broker per second of the cycle
+    max RSS      peak resident memory of the daemon process
+    readings     sensor readings received by the broker, out of the number of sensors
+
+Example:
+    $ python3 benchmark/run_benchmark.py --sensors 1,10,100,500 --adapters 2 --latency 0.02
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from time import time, sleep
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from mqtt_standin import Broker, serve
+
+daemon_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'miflora-mqtt-daemon.py')
+
+
+def start_broker(log):
+    ready = threading.Event()
+    listening = []
+
+    def on_ready(port):
+        listening.append(port)
+        ready.set()
+
+    broker = Broker(log)
+    threading.Thread(target=asyncio.run, args=(serve('127.0.0.1', 0, broker, ready=on_ready), ), daemon=True).start()
+    if not ready.wait(10):
+        raise RuntimeError('MQTT broker stand-in did not start')
+    return broker, listening[0]
+
+
+def write_config(config_dir, sensors, args, port):
+    adapters = ','.join('hci{}'.format(index) for index in range(args.adapters))
+    with open(os.path.join(config_dir, 'config.ini'), 'w') as config_file:
+        config_file.write('[General]\nreporting_method = mqtt-json\nbackend = simulated\nadapter = {}\n'.format(adapters))
+        config_file.write('[Daemon]\nenabled = false\n')
+        config_file.write('[MQTT]\nhostname = 127.0.0.1\nport = {}\nbase_topic = benchmark\n'.format(port))
+        config_file.write('[Simulation]\nlatency = {}\nfailure_rate = {}\n'.format(args.latency, args.failure_rate))
+        config_file.write('[Sensors]\n')
+        for index in range(sensors):
+            config_file.write('Sensor{0:04d} = C4:7C:8D:{1:02X}:{2:02X}:{3:02X}\n'.format(index, index >> 16 & 0xff, index >> 8 & 0xff, index & 0xff))
+
+
+def run(sensors, args):
+    with tempfile.TemporaryDirectory() as config_dir:
+        broker_log_path = os.path.join(config_dir, 'broker.log')
+        with open(broker_log_path, 'w') as broker_log:
+            broker, port = start_broker(broker_log)
+            write_config(config_dir, sensors, args, port)
+            with open(os.path.join(config_dir, 'daemon.log'), 'w') as daemon_log:
+                start = time()
+                process = subprocess.Popen([sys.executable, daemon_path, '--config_dir', config_dir], stdout=daemon_log, stderr=subprocess.STDOUT)
+                # wait4() returns the resource usage of this one child, including its peak memory
+                _, status, usage = os.wait4(process.pid, 0)
+                process.returncode = os.waitstatus_to_exitcode(status)
+                end = time()
+            sleep(0.2)
+        with open(broker_log_path) as broker_log:
+            messages = [json.loads(line) for line in broker_log]
+        if process.returncode != 0:
+            with open(os.path.join(config_dir, 'daemon.log')) as daemon_log:
+                sys.stderr.write(daemon_log.read()[-2000:])
+            raise RuntimeError('Daemon exited with code {}'.format(process.returncode))
+
+    announced = min([message['ts'] for message in messages if message['topic'] == 'benchmark/$announce'], default=start)
+    readings = [message['ts'] for message in messages if message['topic'].startswith('benchmark/Sensor')]
+    cycle = (max(readings) - announced) if readings else 0.0
+    return {
+        'sensors': sensors,
+        'startup': announced - start,
+        'cycle': cycle,
+        'publishes_per_second': len(readings) / cycle if cycle > 0 else 0.0,
+        'max_rss_mib': usage.ru_maxrss / 1024,
+        'readings': len(readings),
+        'total': end - start,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the daemon with simulated Mi Flora sensors')
+    parser.add_argument('--sensors', default='1,10,100,500', help='comma separated fleet sizes (default: 1,10,100,500)')
+    parser.add_argument('--adapters', type=int, default=1, help='number of simulated bluetooth adapters (default: 1)')
+    parser.add_argument('--latency', type=float, default=0.02, help='mean simulated connection latency in seconds (default: 0.02)')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='share of simulated connections that fail (default: 0)')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON lines')
+    args = parser.parse_args()
+
+    if not args.json:
+        print('{:>8} {:>11} {:>9} {:>12} {:>13} {:>10}'.format('sensors', 'startup[s]', 'cycle[s]', 'publishes/s', 'max RSS[MiB]', 'readings'))
+    for sensors in [int(size) for size in args.sensors.split(',')]:
+        result = run(sensors, args)
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print('{sensors:>8} {startup:>11.2f} {cycle:>9.2f} {publishes_per_second:>12.1f} {max_rss_mib:>13.1f} {readings:>6}/{sensors}'.format(**result))
+        sys.stdout.flush()
@@ -0,0 +1,8 @@
+"""Xiaomi Mi Flora Plant Sensor MQTT Client/Daemon.
+
+The daemon polls Mi Flora sensors via Bluetooth Low Energy and publishes their readings, see daemon.main().
+Output formats are implemented as reporters, see the reporters package.
+"""
+
+project_name = 'Xiaomi Mi Flora Plant Sensor MQTT Client/Daemon'
+project_url = 'https://github.com/ThomDietrich/miflora-mqtt-daemon'
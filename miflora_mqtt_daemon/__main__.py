@@ -0,0 +1,3 @@
+from miflora_mqtt_daemon.daemon import main
+
+main()
@@ -0,0 +1,62 @@
+"""Bluetooth backends and connections."""
+
+import threading
+from time import time
+
+from btlewrap import BluetoothBackendException
+from btlewrap.base import BluetoothInterface, _BackendConnection
+
+
+def load_backend(backend_name, simulation):
+    # Only the selected backend is set up, the simulation is configured from its section in config.ini
+    if backend_name == 'simulated':
+        from miflora_mqtt_daemon.simulation import SimulatedBackend
+        SimulatedBackend.configure(simulation)
+        return SimulatedBackend
+    if backend_name == 'gatttool':
+        from btlewrap import GatttoolBackend
+        return GatttoolBackend
+    from btlewrap import BluepyBackend
+    return BluepyBackend
+
+def bluetooth_errors(backend_name):
+    # Exceptions of a failed connection or read, bluepy raises its own next to those of btlewrap
+    errors = (IOError, BluetoothBackendException, RuntimeError, BrokenPipeError)
+    if backend_name == 'bluepy':
+        from bluepy.btle import BTLEException
+        errors += (BTLEException, )
+    return errors
+
+
+# Bluetooth connections, btlewrap serializes the connections of all adapters with one class-wide lock.
+# Every adapter gets its own lock instead, so that sensors on different adapters are polled concurrently.
+class AdapterBluetoothInterface(BluetoothInterface):
+    connection_locks = dict()
+
+    def __init__(self, backend, sensor, metrics, adapter='hci0', **kwargs):
+        super().__init__(backend, adapter=adapter, **kwargs)
+        self._connection_lock = self.connection_locks.setdefault(adapter, threading.Lock())
+        self._sensor = sensor
+        self._metrics = metrics
+
+    def connect(self, mac):
+        return AdapterBackendConnection(self._backend, mac, self._connection_lock, self._sensor, self._metrics)
+
+class AdapterBackendConnection(_BackendConnection):
+    def __init__(self, backend, mac, lock, sensor, metrics):
+        super().__init__(backend, mac)
+        self._lock = lock
+        self._sensor = sensor
+        self._metrics = metrics
+        self._connected = None
+
+    def __enter__(self):
+        start = time()
+        backend = super().__enter__()
+        self._connected = time()
+        self._metrics.observe('miflora_connect_seconds', self._connected - start, sensor=self._sensor)
+        return backend
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        super().__exit__(exc_type, exc_val, exc_tb)
+        self._metrics.observe('miflora_read_seconds', time() - self._connected, sensor=self._sensor)
@@ -0,0 +1,159 @@
+"""Cluster of daemons sharing one broker and the same sensors, every sensor is polled by one node only.
+
+Each node publishes a retained heartbeat with the signal strength it sees per sensor, its adapters and the sensors
+it owns, a last will clears it. From the same heartbeats every node computes the same owner per sensor: greedily
+the node with the strongest signal, minus a penalty growing with its share of the fleet, plus a bonus for the
+current owner against flapping. Nodes that left or went silent are dropped and their sensors taken over.
+"""
+
+import json
+import threading
+from time import sleep, time
+
+from miflora_mqtt_daemon.console import print_line
+from miflora_mqtt_daemon.mqtt import MqttConnection
+
+
+class Cluster:
+    unseen_rssi = -127
+
+    def __init__(self, settings, metrics, flores, index, scan_adapters, reporter):
+        self.node_id = settings.cluster_node_id
+        self.topic = settings.cluster_topic
+        self.heartbeat = settings.cluster_heartbeat
+        self.load_penalty = settings.cluster_load_penalty
+        self.hysteresis = settings.cluster_hysteresis
+        self.adapters = len(settings.used_adapters)
+        self.flores = flores
+        self.index = index
+        self.scan_adapters = scan_adapters
+        self.reporter = reporter
+        self.node_topic = '{}/nodes/{}'.format(self.topic, self.node_id)
+        self.lock = threading.Lock()
+        self.nodes = dict()
+        self.changed = True
+        self.nodes_left = False
+        self.owners = dict()
+        self.own_heartbeat = None
+        self.next_heartbeat = 0
+        # A connection of its own, its last will must not clear what the reporter has published
+        self.connection = MqttConnection(settings, metrics, will=(self.node_topic, '', 1, True))
+        self.connection.client.on_connect = self.on_connect
+        self.connection.client.on_message = self.on_message
+
+    def join(self):
+        print_line('Joining cluster "{}" as node "{}" ...'.format(self.topic, self.node_id))
+        self.connection.connect()
+        self.connection.wait_for_connection()
+        # Give the retained heartbeats of the other nodes time to arrive before the first election
+        sleep(min(2, self.heartbeat))
+        self.update()
+
+    def on_connect(self, client, userdata, flags, rc):
+        self.connection.on_connect(client, userdata, flags, rc)
+        client.subscribe('{}/nodes/+'.format(self.topic), 1)
+
+    def on_message(self, client, userdata, message):
+        node_id = message.topic.split('/')[-1]
+        if node_id == self.node_id:
+            return
+        try:
+            heartbeat = json.loads(message.payload.decode('utf-8')) if message.payload else None
+        except ValueError:
+            return
+        with self.lock:
+            if heartbeat is None:
+                if self.nodes.pop(node_id, None) is not None:
+                    print_line('Cluster node "{}" left'.format(node_id), warning=True, sd_notify=True)
+                    self.nodes_left = True
+            else:
+                if node_id not in self.nodes:
+                    print_line('Cluster node "{}" joined'.format(node_id), sd_notify=True)
+                heartbeat['received'] = time()
+                self.nodes[node_id] = heartbeat
+            self.changed = True
+
+    def elect(self, nodes):
+        assigned = {node_id: 0 for node_id in nodes.keys()}
+        total_adapters = sum(max(1, node['adapters']) for node in nodes.values())
+        owners = dict()
+        for mac in sorted(flora['mac'].upper() for flora in self.flores.values()):
+            def score(node_id):
+                node = nodes[node_id]
+                fair_share = len(self.flores) * max(1, node['adapters']) / total_adapters
+                bonus = self.hysteresis if mac in node['owned'] else 0
+                return (node['rssi'].get(mac, self.unseen_rssi) + bonus - self.load_penalty * assigned[node_id] / fair_share, node_id)
+            owner = max(sorted(nodes.keys()), key=score)
+            owners[mac] = owner
+            assigned[owner] += 1
+        return owners
+
+    def update(self):
+        # Publishes the heartbeat of this node when due and re-elects the owners when the cluster has changed
+        now = time()
+        with self.lock:
+            # Nodes leave by an empty heartbeat, their last will or a clean leave
+            nodes_lost = self.nodes_left
+            self.nodes_left = False
+            for [node_id, node] in list(self.nodes.items()):
+                if now - node['received'] > 3 * self.heartbeat:
+                    print_line('Cluster node "{}" went silent'.format(node_id), warning=True, sd_notify=True)
+                    del self.nodes[node_id]
+                    nodes_lost = True
+            changed = self.changed or nodes_lost
+            self.changed = False
+            nodes = {node_id: node for [node_id, node] in self.nodes.items()}
+
+        if now >= self.next_heartbeat:
+            seen = dict()
+            for flora in self.flores.values():
+                _, rssi = self.index.strongest_sighting(flora['mac'], self.scan_adapters)
+                # Sensors this node cannot reach are left to the others
+                if rssi is not None and flora['stats']['health'] != 'unreachable':
+                    seen[flora['mac'].upper()] = rssi
+            self.own_heartbeat = {
+                'node': self.node_id,
+                'time': int(now),
+                'adapters': self.adapters,
+                'owned': sorted(mac for [mac, owner] in self.owners.items() if owner == self.node_id),
+                'rssi': {mac: int(round(rssi)) for [mac, rssi] in seen.items()},
+            }
+            self.connection.publish(self.node_topic, json.dumps(self.own_heartbeat), 1, True)
+            self.next_heartbeat = now + self.heartbeat
+            changed = True
+        if not changed:
+            return
+
+        # This node takes part with the heartbeat the others have seen
+        nodes[self.node_id] = self.own_heartbeat
+        owners = self.elect(nodes)
+        gained = [mac for [mac, owner] in owners.items() if owner == self.node_id and self.owners.get(mac) != self.node_id]
+        handed = [mac for [mac, owner] in owners.items() if owner != self.node_id and self.owners.get(mac) == self.node_id]
+        self.owners = owners
+        for [flora_name, flora] in self.flores.items():
+            if flora['mac'].upper() in gained:
+                self.reporter.taken_over(flora_name, flora)
+        if gained or handed:
+            print_line('Cluster of {} nodes, this node polls {} of {} sensors ({} taken over, {} handed over)'.format(
+                len(nodes), sum(1 for owner in owners.values() if owner == self.node_id), len(self.flores), len(gained), len(handed)), sd_notify=True)
+        if nodes_lost:
+            # The last will of the lost node may have overwritten what is shared by all nodes
+            self.reporter.online()
+
+    def sensors_changed(self):
+        # Sensors were added or removed, elect again and tell the others right away
+        with self.lock:
+            self.changed = True
+        self.next_heartbeat = 0
+
+    def deadline(self):
+        return self.next_heartbeat
+
+    def owns(self, flora):
+        return self.owners.get(flora['mac'].upper()) == self.node_id
+
+    def leave(self):
+        # Leave the cluster right away instead of after the heartbeat timeout
+        self.connection.publish(self.node_topic, '', 1, True)
+        self.connection.wait_for_publish(self.connection.settings.mqtt_timeout)
+        self.connection.disconnect()
@@ -0,0 +1,193 @@
+"""Configuration file "config.ini", the daemon settings and the sensor definitions."""
+
+import os.path
+import re
+import socket
+from collections import OrderedDict
+from configparser import ConfigParser
+
+from miflora.miflora_poller import MI_BATTERY
+from unidecode import unidecode
+
+from miflora_mqtt_daemon.parameters import parameters
+from miflora_mqtt_daemon.reporters import reporter_classes
+
+# Identifier cleanup
+def clean_identifier(name):
+    clean = name.strip()
+    for this, that in [[' ', '-'], ['ä', 'ae'], ['Ä', 'Ae'], ['ö', 'oe'], ['Ö', 'Oe'], ['ü', 'ue'], ['Ü', 'Ue'], ['ß', 'ss']]:
+        clean = clean.replace(this, that)
+    clean = unidecode(clean)
+    return clean
+
+# Sensor definition parsing, e.g. "C4:7C:8D:11:22:33 adapter=hci1 period=60"
+sensor_options = ['adapter', 'period']
+def parse_sensor_definition(definition):
+    mac, *option_list = re.split(r'[\s,]+', definition.strip())
+    options = dict()
+    for option in option_list:
+        key, _, value = option.partition('=')
+        if key not in sensor_options or not value:
+            raise ValueError('Unknown sensor option "{}"'.format(option))
+        options[key] = value
+    return mac, options
+
+def parse_flora(index, name, definition, default_period, used_adapters):
+    # Returns the settings of a sensor from its [Sensors] entry, raises ValueError for invalid ones
+    try:
+        mac, options = parse_sensor_definition(definition)
+    except ValueError as e:
+        raise ValueError('{} for sensor "{}". Please check your configuration'.format(e, name))
+    if not re.match("[0-9a-f]{2}:[0-9a-f]{2}:[0-9a-f]{2}:[0-9a-f]{2}:[0-9a-f]{2}:[0-9a-f]{2}", mac.lower()):
+        raise ValueError('The MAC address "{}" seems to be in the wrong format. Please check your configuration'.format(mac))
+
+    # Distribute sensors round-robin over all adapters unless pinned to one
+    adapter = options.get('adapter', used_adapters[index % len(used_adapters)])
+    if adapter not in used_adapters:
+        raise ValueError('The adapter "{}" of sensor "{}" is not listed in the "adapter" setting. Please check your configuration'.format(adapter, name))
+
+    try:
+        period = int(options.get('period', default_period))
+        if period <= 0:
+            raise ValueError
+    except ValueError:
+        raise ValueError('The period "{}" of sensor "{}" is not a positive number of seconds. Please check your configuration'.format(options.get('period', default_period), name))
+
+    if '@' in name:
+        name_pretty, location_pretty = name.split('@')
+    else:
+        name_pretty, location_pretty = name, ''
+    return {'name_clean': clean_identifier(name_pretty), 'name_pretty': name_pretty, 'location_clean': clean_identifier(location_pretty),
+            'location_pretty': location_pretty, 'mac': mac, 'adapter': adapter, 'pinned': options.get('adapter'), 'period': period}
+
+def parse_sensors(config, used_adapters):
+    # Returns the settings of all sensors by their internal name, raises ValueError for invalid ones
+    default_period = config['Daemon'].getint('period', 300)
+    sensors = OrderedDict()
+    for index, [name, definition] in enumerate(config['Sensors'].items()):
+        sensor = parse_flora(index, name, definition, default_period, used_adapters)
+        sensors[sensor['name_clean']] = sensor
+    if not sensors:
+        raise ValueError('No sensors found in configuration file "config.ini"')
+    return sensors
+
+def parse_deadbands(config):
+    # Returns the deadband per parameter, either an absolute amount in the unit of the parameter or a percentage of the last published value
+    deadbands = dict()
+    if not config.has_section('Deadbands'):
+        return deadbands
+    for [param, deadband] in config.items('Deadbands', raw=True):
+        if param not in parameters:
+            raise ValueError('Deadband for unknown parameter "{}". Please check your configuration'.format(param))
+        try:
+            deadbands[param] = (float(deadband.rstrip('%')), deadband.endswith('%'))
+            if deadbands[param][0] < 0:
+                raise ValueError
+        except ValueError:
+            raise ValueError('The deadband "{}" of parameter "{}" is not a positive number or percentage. Please check your configuration'.format(deadband, param))
+    return deadbands
+
+def read_config(config_dir):
+    # Raises IOError if the file is missing and configparser.Error if it is malformed
+    config = ConfigParser(delimiters=('=', ), inline_comment_prefixes=('#'))
+    config.optionxform = str
+    with open(os.path.join(config_dir, 'config.ini')) as config_file:
+        config.read_file(config_file)
+    if not config.has_section('Simulation'):
+        config.add_section('Simulation')
+    return config
+
+# Configuration reload, only the sensors, the deadbands and the period are applied to the running daemon
+def reloadable(section, key):
+    return section in ['Sensors', 'Deadbands'] or (section, key) == ('Daemon', 'period')
+
+def config_values(config):
+    return {(section, key): value for section in config.sections() for [key, value] in config.items(section, raw=True)}
+
+
+class Settings:
+    """The settings of [General], [Daemon], [MQTT] and [Cluster], read once at startup."""
+
+    def __init__(self, config, config_dir):
+        self.config_dir = config_dir
+        self.reporting_mode = config['General'].get('reporting_method', 'mqtt-json')
+        self.reading_source = config['General'].get('source', 'active')
+        self.backend_name = config['General'].get('backend', 'bluepy')
+        self.used_adapters = [adapter.strip() for adapter in config['General'].get('adapter', 'hci0').split(',') if adapter.strip()]
+        # A background scan on all adapters keeps an index of the sensors in range, sensors not seen are not connected to
+        self.scan_enabled = config['General'].getboolean('scan', False)
+        self.scan_max_age = config['General'].getint('scan_max_age', 300)
+        self.daemon_enabled = config['Daemon'].getboolean('enabled', True)
+
+        reporter_class = reporter_classes.get(self.reporting_mode)
+        default_base_topic = reporter_class.default_base_topic if reporter_class else 'miflora'
+        self.base_topic = config['MQTT'].get('base_topic', default_base_topic).lower()
+        self.mqtt_inflight = config['MQTT'].getint('max_inflight', 20)
+        self.mqtt_timeout = config['MQTT'].getint('timeout', 10)
+        self.sleep_period = config['Daemon'].getint('period', 300)
+        # Failed polls are retried with exponential backoff, chronically failing sensors are only probed occasionally
+        self.retry_backoff = config['Daemon'].getint('retry_backoff', 15)
+        self.failure_threshold = config['Daemon'].getint('failure_threshold', 5)
+        self.probe_period = config['Daemon'].getint('probe_period', 1800)
+        # Battery level and firmware change over days, they are read less often than the measurements
+        self.slow_field_periods = OrderedDict([
+            (MI_BATTERY, config['Daemon'].getint('battery_period', 86400)),
+            ('firmware', config['Daemon'].getint('firmware_period', 86400)),
+        ])
+        # Instead of the current values, the hourly log of the sensor is downloaded, records already published are skipped
+        self.history_enabled = config['Daemon'].getboolean('history', False)
+        self.history_backfill = config['Daemon'].getint('history_backfill', 168)
+        self.state_path = config['Daemon'].get('state_file', 'miflora-state.json')
+        # Values within their deadband of the last published value are not published again, until the heartbeat is due
+        self.heartbeat = config['Daemon'].getint('heartbeat', 3600)
+        self.batch_interval = config['MQTT'].getint('batch_interval', self.sleep_period)
+        # Several daemons sharing one broker split the sensors among themselves, see cluster.py
+        self.cluster_enabled = config.has_section('Cluster') and config['Cluster'].getboolean('enabled', False)
+        if self.cluster_enabled:
+            self.cluster_node_id = clean_identifier(config['Cluster'].get('node_id', socket.gethostname())).lower()
+            self.cluster_topic = config['Cluster'].get('topic', '{}/$cluster'.format(self.base_topic or 'miflora'))
+            self.cluster_heartbeat = config['Cluster'].getint('heartbeat', 30)
+            self.cluster_load_penalty = config['Cluster'].getfloat('load_penalty', 10.0)
+            self.cluster_hysteresis = config['Cluster'].getfloat('hysteresis', 5.0)
+        self.snapshot_format = config['MQTT'].get('snapshot', '')
+        self.snapshot_topic = config['MQTT'].get('snapshot_topic', '{}/$snapshot'.format(self.base_topic))
+        self.journal_path = config['MQTT'].get('journal', '')
+        self.journal_max_age = config['MQTT'].getint('journal_max_age', 604800)
+        self.journal_max_entries = config['MQTT'].getint('journal_max_entries', 100000)
+        self.journal_sync_interval = config['MQTT'].getint('journal_sync_interval', 30)
+        self.metrics_port = config['Daemon'].getint('metrics_port', 0)
+        self.metrics_address = config['Daemon'].get('metrics_address', '127.0.0.1')
+        self.mqtt = config['MQTT']
+        self.simulation = config['Simulation']
+
+    def check(self):
+        # Raises ValueError for invalid settings, returns warnings about settings that do not apply and were reset
+        if self.reporting_mode not in reporter_classes:
+            raise ValueError('Configuration parameter reporting_mode set to an invalid value')
+        if self.reading_source not in ['active', 'passive']:
+            raise ValueError('Configuration parameter source set to an invalid value')
+        if self.backend_name not in ['bluepy', 'gatttool', 'simulated']:
+            raise ValueError('Configuration parameter backend set to an invalid value')
+        if not self.used_adapters:
+            raise ValueError('Configuration parameter adapter must name at least one bluetooth adapter')
+        if self.snapshot_format not in ['', 'json', 'cbor', 'msgpack']:
+            raise ValueError('Configuration parameter snapshot set to an invalid value')
+        reporter_class = reporter_classes[self.reporting_mode]
+        # Reporters that do not keep a connection to the broker can neither journal nor take part in a cluster
+        connected = reporter_class.uses_mqtt and reporter_class.background_loop
+        if self.cluster_enabled and not connected:
+            raise ValueError('Cluster mode is not available for "reporting_method = {}"'.format(self.reporting_mode))
+
+        warnings = []
+        if self.journal_path and not connected:
+            warnings.append('Parameter "journal" ignored for "reporting_method = {}"'.format(self.reporting_mode))
+            self.journal_path = ''
+        if self.history_enabled and self.reading_source == 'passive':
+            warnings.append('Parameter "history" ignored for "source = passive"')
+            self.history_enabled = False
+        if self.snapshot_format and not reporter_class.snapshots:
+            warnings.append('Parameter "snapshot" ignored for "reporting_method = {}"'.format(self.reporting_mode))
+            self.snapshot_format = ''
+        if self.base_topic and not reporter_class.default_base_topic:
+            warnings.append('Parameter "base_topic" ignored for "reporting_method = {}"'.format(self.reporting_mode))
+        return warnings
@@ -0,0 +1,49 @@
+"""Console output and systemd notifications."""
+
+import sys
+from time import localtime, strftime
+
+import sdnotify
+from unidecode import unidecode
+
+from miflora_mqtt_daemon import project_name, project_url
+
+# Systemd Service Notifications - https://github.com/bb4242/sdnotify
+sd_notifier = sdnotify.SystemdNotifier()
+
+# Colored output on terminals only, colorama is not loaded at all when writing to a file or the journal
+colors = None
+
+def console_colors():
+    global colors
+    if colors is None:
+        if sys.stdout.isatty():
+            from colorama import init as colorama_init
+            from colorama import Fore, Style
+            colorama_init()
+            colors = dict(green=Fore.GREEN, yellow=Fore.YELLOW, red=Fore.RED, bright=Style.BRIGHT, reset=Style.RESET_ALL)
+        else:
+            colors = dict(green='', yellow='', red='', bright='', reset='')
+    return colors
+
+def print_intro():
+    color = console_colors()
+    print(color['green'] + color['bright'])
+    print(project_name)
+    print('Source:', project_url)
+    print(color['reset'])
+
+# Logging function
+def print_line(text, error = False, warning=False, sd_notify=False, console=True):
+    timestamp = strftime('%Y-%m-%d %H:%M:%S', localtime())
+    if console:
+        color = console_colors()
+        if error:
+            print(color['red'] + color['bright'] + '[{}] '.format(timestamp) + color['reset'] + '{}'.format(text) + color['reset'], file=sys.stderr)
+        elif warning:
+            print(color['yellow'] + '[{}] '.format(timestamp) + color['reset'] + '{}'.format(text) + color['reset'])
+        else:
+            print(color['green'] + '[{}] '.format(timestamp) + color['reset'] + '{}'.format(text) + color['reset'])
+    timestamp_sd = strftime('%b %d %H:%M:%S', localtime())
+    if sd_notify:
+        sd_notifier.notify('STATUS={} - {}.'.format(timestamp_sd, unidecode(text)))
@@ -0,0 +1,628 @@
+"""The daemon, polls the sensors on their cadence and hands the readings to the reporter of the configured output format."""
+
+import argparse
+import heapq
+import json
+import os.path
+import random
+import sys
+import threading
+from collections import OrderedDict
+from configparser import Error as ConfigParserError
+from datetime import timedelta
+from itertools import count
+from queue import Empty, PriorityQueue, Queue
+from signal import SIGHUP, SIGPIPE, SIGTERM, SIG_DFL, signal
+from time import localtime, strftime, time
+
+from miflora.miflora_poller import MiFloraPoller
+
+from miflora_mqtt_daemon import project_name, project_url
+from miflora_mqtt_daemon.bluetooth import AdapterBluetoothInterface, bluetooth_errors, load_backend
+from miflora_mqtt_daemon.config import Settings, config_values, parse_deadbands, parse_sensors, read_config, reloadable
+from miflora_mqtt_daemon.console import print_intro, print_line, sd_notifier
+from miflora_mqtt_daemon.metrics import Metrics
+from miflora_mqtt_daemon.polling import FloraReader
+from miflora_mqtt_daemon.reporters import reporter_classes
+from miflora_mqtt_daemon.scanning import AdvertisementIndex, BluepyAdvertisementScanner
+from miflora_mqtt_daemon.snapshot import Snapshot, snapshot_encoder
+from miflora_mqtt_daemon.state import load_state, save_state
+
+def check_firmware(flora):
+    if int(flora['firmware'].replace(".", "")) < 319:
+        print_line('Mi Flora sensor "{}" ({}) with a firmware version before 3.1.9 is not supported. Please update now.'.format(flora['name_pretty'], flora['mac']), error=True, sd_notify=True)
+
+
+class Daemon:
+    # Advertisements of a sensor in range are received within a few scan windows, until then sensors are not reported missing
+    scan_grace = 30
+    # The signal strength varies by a few dB, only a clearly better adapter takes over
+    adapter_switch_margin = 5
+    # Attempts per sensor in non-daemon mode, failed polls are retried after retry_backoff
+    single_run_attempts = 3
+
+    def __init__(self, config, settings, sensors, deadbands, snapshot_encode):
+        self.config = config
+        self.settings = settings
+        self.metrics = Metrics(settings.metrics_port, settings.metrics_address)
+        self.metrics.gauges = self.gauges
+        self.loaded_config_values = config_values(config)
+        self.reload_requested = False
+
+        self.reporter = reporter_classes[settings.reporting_mode](None, settings)
+        self.set_deadbands(deadbands)
+        self.mqtt = None
+        if self.reporter.uses_mqtt:
+            from miflora_mqtt_daemon.mqtt import MqttConnection
+
+            print_line('Connecting to MQTT broker ...')
+            self.mqtt = self.reporter.mqtt = MqttConnection(settings, self.metrics, will=self.reporter.will())
+            self.mqtt.connect(self.reporter.background_loop)
+            if self.reporter.background_loop:
+                self.mqtt.wait_for_connection()
+
+        sd_notifier.notify('READY=1')
+
+        self.backend = load_backend(settings.backend_name, settings.simulation)
+        self.errors = bluetooth_errors(settings.backend_name)
+        self.state_path = os.path.join(settings.config_dir, settings.state_path)
+        self.device_state = load_state(self.state_path)
+        self.flores = OrderedDict()
+        for [flora_name, sensor] in sensors.items():
+            self.flores[flora_name] = self.create_flora(sensor)
+            self.reporter.add(flora_name, self.flores[flora_name])
+
+        self.reporter.announce(list(self.flores.keys()))
+        print()
+        print_line('Initialization complete, starting MQTT publish loop', console=False, sd_notify=True)
+
+        # Regular polls of healthy sensors are served before retries and probes of failing ones
+        self.index = AdvertisementIndex(settings.scan_max_age)
+        self.poll_jobs = dict()
+        self.poll_job_sequence = count()
+        self.poll_results = Queue()
+        self.adapter_locks = dict()
+        self.reader = FloraReader(settings, self.errors, self.index, self.adapter_locks)
+        for adapter in settings.used_adapters:
+            self.poll_jobs[adapter] = PriorityQueue()
+            self.adapter_locks[adapter] = threading.Lock()
+            threading.Thread(target=self.adapter_worker, args=(adapter, ), name='poller-{}'.format(adapter), daemon=True).start()
+
+        self.scan_adapters = settings.used_adapters if settings.scan_enabled else settings.used_adapters[:1]
+        self.scan_start = time()
+        self.scanning = settings.reading_source == 'passive' or settings.cluster_enabled or settings.scan_enabled
+        if self.scanning:
+            for flora in self.flores.values():
+                self.index.track(flora['mac'], settings.reading_source == 'passive')
+            print_line('Listening for Mi Flora advertisements on {} ...'.format(', '.join(self.scan_adapters)))
+            if settings.backend_name == 'simulated':
+                from miflora_mqtt_daemon.simulation import SimulatedAdvertisementScanner as scanner_class
+            else:
+                scanner_class = BluepyAdvertisementScanner
+            for adapter in self.scan_adapters:
+                scanner_class(adapter, self.index, self.adapter_locks[adapter], self.poll_jobs[adapter], settings.reading_source == 'passive').start()
+
+        self.snapshot = Snapshot(self.mqtt, settings, self.flores, snapshot_encode) if settings.snapshot_format else None
+
+        # The journal database is only opened, and sqlite3 only imported, if configured
+        self.journal = None
+        self.journal_replay_time = 0
+        self.journal_failures = 0
+        if settings.journal_path:
+            from miflora_mqtt_daemon.journal import Journal
+
+            self.journal = Journal(os.path.join(settings.config_dir, settings.journal_path), settings)
+            print_line('Journaling readings while the MQTT broker is unreachable to "{}"'.format(settings.journal_path))
+
+        signal(SIGTERM, self.on_sigterm)
+
+        self.cluster = None
+        if settings.cluster_enabled:
+            from miflora_mqtt_daemon.cluster import Cluster
+
+            self.cluster = Cluster(settings, self.metrics, self.flores, self.index, self.scan_adapters, self.reporter)
+            self.cluster.join()
+            # Batches are complete once the sensors polled by this node have reported
+            self.reporter.owns = self.owns
+            if self.snapshot is not None:
+                self.snapshot.owns = self.owns
+
+        # Every sensor is kept on its own fixed cadence by a priority queue of next-due times.
+        # The first polls are spread evenly over the period to avoid bursts of BLE traffic,
+        # sensors without cached metadata are polled right away.
+        self.schedule = []
+        self.schedule_anchors = dict()
+        self.dispatch_times = dict()
+        scheduler_start = time()
+        for index, [flora_name, flora] in enumerate(self.flores.items()):
+            offset = flora['refresh'] * index / len(self.flores) if settings.daemon_enabled else 0
+            self.schedule_anchors[flora_name] = scheduler_start + offset
+            if 'firmware' not in self.device_state.get(flora['mac'], dict()):
+                offset = 0
+            heapq.heappush(self.schedule, (scheduler_start + offset, flora_name))
+        self.polls_pending = 0
+
+        signal(SIGHUP, self.on_sighup)
+        self.metrics.serve()
+
+    # Initialize Mi Flora sensors, at startup and when added by a configuration reload
+    def create_flora(self, sensor):
+        name_clean = sensor['name_clean']
+        flora = OrderedDict()
+        print('Adding sensor to device list ...')
+        print('Name:          "{}"'.format(sensor['name_pretty']))
+
+        flora_poller = MiFloraPoller(mac=sensor['mac'], backend=self.backend, cache_timeout=sensor['period'] - 1, adapter=sensor['adapter'])
+        flora['poller'] = flora_poller
+        flora['name_pretty'] = sensor['name_pretty']
+        flora['mac'] = flora_poller._mac
+        flora['interfaces'] = dict()
+        self.use_adapter(name_clean, flora, sensor['adapter'])
+        flora['pinned'] = sensor['pinned']
+        flora['out_of_range'] = False
+        flora['refresh'] = sensor['period']
+        flora['location_clean'] = sensor['location_clean']
+        flora['location_pretty'] = sensor['location_pretty']
+        flora['stats'] = {"count": 0, "success": 0, "failure": 0, "consecutive_failures": 0, "health": "healthy"}
+        # No connection is made here, the metadata is taken from the state file and refreshed by the first poll
+        flora_state = self.device_state.get(flora['mac'], dict())
+        flora['firmware'] = flora_state.get('firmware', "0.0.0")
+        flora['device_name'] = flora_state.get('name')
+        flora['tiers'] = dict()
+        flora['published'] = dict()
+        flora['published_time'] = 0
+        print('Internal name: "{}"'.format(name_clean))
+        print('Device name:   "{}"'.format(flora['device_name'] or 'unknown'))
+        print('MAC address:   {}'.format(flora_poller._mac))
+        print('Adapter:       {}'.format(sensor['adapter']))
+        print('Firmware:      {}'.format(flora['firmware'] if 'firmware' in flora_state else 'unknown'))
+        print('Last read:     {}'.format(strftime('%Y-%m-%d %H:%M:%S', localtime(flora_state['last_good'])) if 'last_good' in flora_state else 'never'))
+        if 'firmware' in flora_state:
+            check_firmware(flora)
+
+        print()
+        return flora
+
+    # The poller connects via the adapter of its bluetooth interface, one interface per adapter is kept for switching
+    def use_adapter(self, flora_name, flora, adapter):
+        if adapter not in flora['interfaces']:
+            flora['interfaces'][adapter] = AdapterBluetoothInterface(self.backend, flora_name, self.metrics, adapter=adapter)
+        flora['poller']._bt_interface = flora['interfaces'][adapter]
+        flora['adapter'] = adapter
+
+    # Device metadata, cached so that discovery is announced right away instead of after connecting to every sensor
+    def update_metadata(self, flora_name, flora):
+        flora_state = self.device_state.setdefault(flora['mac'], dict())
+        flora_state['last_good'] = int(time())
+        # Until the sensor was connected to, e.g. in passive mode, the firmware is a placeholder and the name unknown
+        if not flora['tiers'].get('firmware', (None, 0))[0] or flora['device_name'] is None:
+            return
+        metadata = {'firmware': flora['firmware'], 'name': flora['device_name']}
+        if all(flora_state.get(key) == value for [key, value] in metadata.items()):
+            return
+        print_line('Metadata of Mi Flora sensor "{}" ({}) changed, firmware {}, device name "{}"'.format(flora['name_pretty'], flora['mac'], flora['firmware'], flora['device_name']), sd_notify=True)
+        flora_state.update(metadata)
+        save_state(self.state_path, self.device_state)
+        check_firmware(flora)
+        self.reporter.discover([flora_name])
+
+    # Sensor data retrieval, runs in one worker thread per bluetooth adapter
+    def adapter_worker(self, adapter):
+        # Delivers a list of (timestamp, data) readings per sensor, or None if it could not be read
+        jobs = self.poll_jobs[adapter]
+        while True:
+            _, _, flora_name = jobs.get()
+            flora = self.flores.get(flora_name)
+            history_position = None
+            start = time()
+            if flora is None:
+                # Removed by a configuration reload while waiting
+                self.poll_results.put((flora_name, None, None, None))
+                continue
+            try:
+                if self.settings.reading_source == 'passive':
+                    data = self.reader.read_passive(flora)
+                elif self.settings.history_enabled:
+                    with self.adapter_locks[adapter]:
+                        last_synced = self.device_state.get(flora['mac'], dict()).get('history_device_time')
+                        data, history_position = self.reader.sync_history(flora, last_synced)
+                else:
+                    with self.adapter_locks[adapter]:
+                        data = self.reader.poll(flora)
+            except Exception as e:
+                print_line('Unexpected error while polling sensor "{}" via {}: {}'.format(flora_name, adapter, e), error=True)
+                data = None
+            self.metrics.count('miflora_adapter_busy_seconds_total', time() - start, adapter=adapter)
+            if isinstance(data, OrderedDict):
+                data = [(time(), data)]
+            self.poll_results.put((flora_name, flora, data, history_position))
+
+    def set_deadbands(self, deadbands):
+        self.deadbands = deadbands
+        self.deadbands_enabled = bool(deadbands)
+        # Without deadbands every reading is published, otherwise unchanged values only by the heartbeat
+        self.reporter.heartbeat = self.settings.heartbeat if self.deadbands_enabled else None
+
+    # Change-based reporting, returns the values of a reading to publish, or nothing if all stayed within their deadbands.
+    # Reporters with one message per value publish the changed values only, those with one payload per reading all of them.
+    def significant_changes(self, flora, data, timestamp):
+        if not self.deadbands_enabled:
+            return data
+        published = flora['published']
+        changed = OrderedDict()
+        for [param, value] in data.items():
+            deadband = self.deadbands.get(param)
+            last = published.get(param)
+            if deadband is None or last is None:
+                changed[param] = value
+            elif abs(value - last) > (abs(last) * deadband[0] / 100 if deadband[1] else deadband[0]):
+                changed[param] = value
+        # The heartbeat counts from the last time all values were published
+        if timestamp - flora['published_time'] >= self.settings.heartbeat or (changed and not self.reporter.per_value):
+            changed = data
+            flora['published_time'] = timestamp
+        elif not changed:
+            return None
+        published.update(changed)
+        return changed
+
+    def journal_replay(self):
+        # Replays the oldest readings, returns whether readings are left
+        rows = self.journal.oldest()
+        if not rows:
+            return False
+        print_line('Replaying {} journaled readings ...'.format(len(rows)))
+        # Readings stay in the journal until the broker has acknowledged them, which takes QoS 1 at least
+        self.mqtt.min_qos = 1
+        try:
+            for [row_id, flora_name, timestamp, data, read_times] in rows:
+                if flora_name in self.flores:
+                    self.reporter.publish(flora_name, self.flores[flora_name], data, timestamp, read_times, historic=True)
+            self.reporter.flush(force=True)
+        finally:
+            self.mqtt.min_qos = 0
+        if not self.mqtt.wait_for_publish(self.settings.mqtt_timeout):
+            # Back off before sending the chunk again, the broker may be overloaded
+            self.journal_failures += 1
+            backoff = min(self.settings.retry_backoff * 2 ** (self.journal_failures - 1), self.settings.probe_period)
+            self.journal_replay_time = time() + backoff
+            print_line('Replay of journaled readings not acknowledged, retrying in {} seconds'.format(backoff), warning=True)
+            return True
+        self.journal_failures = 0
+        self.journal.delete(rows[-1][0])
+        return len(rows) == self.journal.replay_chunk
+
+    # Sensor health, returns when the sensor is due next
+    def next_slot(self, flora_name, after):
+        period = self.flores[flora_name]['refresh']
+        return self.schedule_anchors[flora_name] + (int((after - self.schedule_anchors[flora_name]) // period) + 1) * period
+
+    def update_health(self, flora_name, flora, success):
+        stats = flora['stats']
+        now = time()
+        if success:
+            if stats['health'] != 'healthy':
+                print_line('Mi Flora sensor "{}" ({}) recovered after {} failed attempts'.format(flora['name_pretty'], flora['mac'], stats['consecutive_failures']), sd_notify=True)
+            stats['consecutive_failures'] = 0
+            stats['health'] = 'healthy'
+            return self.next_slot(flora_name, now)
+
+        stats['consecutive_failures'] += 1
+        if stats['consecutive_failures'] >= self.settings.failure_threshold:
+            # Circuit breaker, stop spending connection timeouts on the sensor and only probe it now and then
+            if stats['health'] != 'unreachable':
+                print_line('Mi Flora sensor "{}" ({}) failed {} times in a row, probing it every {} seconds'.format(flora['name_pretty'], flora['mac'], stats['consecutive_failures'], self.settings.probe_period), warning=True, sd_notify=True)
+            stats['health'] = 'unreachable'
+            return now + self.settings.probe_period * random.uniform(0.9, 1.1)
+        # Exponential backoff with jitter, but never later than the regular cadence
+        stats['health'] = 'retrying'
+        backoff = self.settings.retry_backoff * 2 ** (stats['consecutive_failures'] - 1)
+        return min(now + backoff * random.uniform(0.5, 1.0), self.next_slot(flora_name, now))
+
+    # Background scan, returns whether the sensor was seen recently and moves it to the adapter with the strongest signal
+    def scan_check(self, flora_name, flora):
+        adapters = [flora['pinned']] if flora['pinned'] else self.settings.used_adapters
+        adapter, rssi = self.index.strongest_sighting(flora['mac'], adapters)
+        if adapter is None:
+            if not flora['out_of_range'] and time() - self.scan_start > self.scan_grace:
+                flora['out_of_range'] = True
+                # Sensors never seen are missing since the scan started
+                missing = time() - (self.index.last_seen(flora['mac'], adapters) or self.scan_start)
+                print_line('Mi Flora sensor "{}" ({}) not seen for {:.0f} seconds, not polling it until it is in range again'.format(flora['name_pretty'], flora['mac'], missing), warning=True, sd_notify=True)
+            return False
+        if flora['out_of_range']:
+            flora['out_of_range'] = False
+            print_line('Mi Flora sensor "{}" ({}) is in range again'.format(flora['name_pretty'], flora['mac']), sd_notify=True)
+        if adapter != flora['adapter']:
+            _, current_rssi = self.index.strongest_sighting(flora['mac'], [flora['adapter']])
+            if current_rssi is None or rssi - current_rssi > self.adapter_switch_margin:
+                print_line('Mi Flora sensor "{}" ({}) is received best via {} ({:.0f} dBm), switching from {}'.format(flora['name_pretty'], flora['mac'], adapter, rssi, flora['adapter']))
+                self.use_adapter(flora_name, flora, adapter)
+        return True
+
+    def owns(self, flora):
+        return self.cluster is None or self.cluster.owns(flora)
+
+    def gauges(self):
+        # Taken from the daemon state when the metrics are scraped, on the HTTP thread while a reload may change the sensors
+        flores = list(self.flores.items())
+        return [
+            ('miflora_period_seconds', 'Configured polling period of a sensor', [((('sensor', flora_name), ), flora['refresh']) for [flora_name, flora] in flores]),
+            ('miflora_last_success_timestamp_seconds', 'Time of the last successful read of a sensor', [((('sensor', flora_name), ), self.device_state[flora['mac']]['last_good']) for [flora_name, flora] in flores if 'last_good' in self.device_state.get(flora['mac'], dict())]),
+            ('miflora_consecutive_failures', 'Failed polls of a sensor since its last success', [((('sensor', flora_name), ), flora['stats']['consecutive_failures']) for [flora_name, flora] in flores]),
+            ('miflora_poll_queue_depth', 'Polls waiting for an adapter', [((('adapter', adapter), ), jobs.qsize()) for [adapter, jobs] in self.poll_jobs.items()]),
+            ('miflora_mqtt_unacknowledged_messages', 'MQTT messages waiting for their acknowledgement', [((), self.mqtt.unacknowledged() if self.mqtt else 0)]),
+        ]
+
+    # Configuration reload on SIGHUP, e.g. by "systemctl reload". Sensors are added, removed or updated while the
+    # others keep their schedule. Changes of other settings than [Sensors], [Deadbands] and the period take a restart.
+    def on_sighup(self, signum, frame):
+        self.reload_requested = True
+        # The main loop may be waiting for a result, wake it up from another thread as the queue is not reentrant
+        threading.Thread(target=self.poll_results.put, args=((None, None, None, None), ), daemon=True).start()
+
+    def on_sigterm(self, signum, frame):
+        raise KeyboardInterrupt
+
+    def reload_config(self):
+        self.reload_requested = False
+        print_line('Reloading configuration file "config.ini" ...', sd_notify=True)
+        try:
+            new_config = read_config(self.settings.config_dir)
+            sensors = parse_sensors(new_config, self.settings.used_adapters)
+            deadbands = parse_deadbands(new_config)
+        except (IOError, KeyError, ValueError, ConfigParserError) as e:
+            print_line('Configuration not reloaded, keeping the current one: {}'.format(e), error=True, sd_notify=True)
+            return
+
+        new_values = config_values(new_config)
+        ignored = sorted(key for key in set(self.loaded_config_values) | set(new_values) if not reloadable(*key) and self.loaded_config_values.get(key) != new_values.get(key))
+        if ignored:
+            print_line('Changes of {} take effect after a restart'.format(', '.join('[{}] {}'.format(section, key) for [section, key] in ignored)), warning=True, sd_notify=True)
+        self.loaded_config_values = dict([(key, value) for [key, value] in self.loaded_config_values.items() if not reloadable(*key)] +
+                                         [(key, value) for [key, value] in new_values.items() if reloadable(*key)])
+
+        now = time()
+        flores = self.flores
+        removed = [flora_name for [flora_name, flora] in flores.items() if flora_name not in sensors or sensors[flora_name]['mac'].upper() != flora['mac'].upper()]
+        for flora_name in removed:
+            flora = flores.pop(flora_name)
+            self.schedule[:] = [entry for entry in self.schedule if entry[1] != flora_name]
+            heapq.heapify(self.schedule)
+            del self.schedule_anchors[flora_name]
+            if not any(other['mac'].upper() == flora['mac'].upper() for other in flores.values()):
+                self.index.forget(flora['mac'])
+            print_line('Removing sensor "{}" ({})'.format(flora['name_pretty'], flora['mac']), sd_notify=True)
+            self.reporter.remove(flora_name, flora)
+
+        changed = []
+        for [flora_name, sensor] in sensors.items():
+            flora = flores.get(flora_name)
+            if flora is None:
+                continue
+            changes = []
+            if sensor['period'] != flora['refresh']:
+                changes.append('period {} seconds'.format(sensor['period']))
+                flora['refresh'] = sensor['period']
+                flora['poller']._cache_timeout = timedelta(seconds=sensor['period'] - 1)
+                # Unless it is being polled, the sensor moves to the next slot of its new cadence
+                self.schedule[:] = [(self.next_slot(flora_name, now), name) if name == flora_name else (due, name) for [due, name] in self.schedule]
+                heapq.heapify(self.schedule)
+            if sensor['pinned'] != flora['pinned']:
+                changes.append('adapter {}'.format(sensor['pinned'] or 'not pinned'))
+                flora['pinned'] = sensor['pinned']
+            if (sensor['name_pretty'], sensor['location_pretty']) != (flora['name_pretty'], flora['location_pretty']):
+                changes.append('name "{}" at "{}"'.format(sensor['name_pretty'], sensor['location_pretty']))
+                for key in ['name_pretty', 'location_clean', 'location_pretty']:
+                    flora[key] = sensor[key]
+            if changes:
+                print_line('Updating sensor "{}" ({}): {}'.format(flora['name_pretty'], flora['mac'], ', '.join(changes)), sd_notify=True)
+                changed.append(flora_name)
+
+        added = [flora_name for flora_name in sensors.keys() if flora_name not in flores]
+        for flora_name in added:
+            flora = flores[flora_name] = self.create_flora(sensors[flora_name])
+            self.reporter.add(flora_name, flora)
+            if self.scanning:
+                self.index.track(flora['mac'], self.settings.reading_source == 'passive')
+            self.schedule_anchors[flora_name] = now
+            heapq.heappush(self.schedule, (now, flora_name))
+
+        reannounced = []
+        if deadbands != self.deadbands:
+            print_line('Updating deadbands: {}'.format(', '.join('{} {}{}'.format(param, amount, '%' if relative else '') for [param, (amount, relative)] in deadbands.items()) or 'none'), sd_notify=True)
+            self.set_deadbands(deadbands)
+            reannounced = self.reporter.deadbands_changed()
+
+        announced = [flora_name for flora_name in flores.keys() if flora_name in changed or flora_name in added or flora_name in reannounced]
+        if announced:
+            self.reporter.discover(announced)
+        if self.cluster is not None and (removed or added):
+            self.cluster.sensors_changed()
+        print_line('Configuration reloaded, {} sensors added, {} removed, {} updated'.format(len(added), len(removed), len(changed)), sd_notify=True)
+
+    # Sensor polling and publication loop
+    def run(self):
+        try:
+            self.loop()
+        except KeyboardInterrupt:
+            print_line('Shutting down ...', sd_notify=True)
+            save_state(self.state_path, self.device_state)
+            self.shutdown(announce_offline=True)
+        else:
+            print_line('Execution finished in non-daemon-mode', sd_notify=True)
+            save_state(self.state_path, self.device_state)
+            self.shutdown(announce_offline=False)
+
+    def loop(self):
+        settings, flores, schedule, reporter = self.settings, self.flores, self.schedule, self.reporter
+        mqtt_connects_seen = self.mqtt.connects if self.mqtt else 0
+        journal_pending = self.journal is not None
+        while schedule or self.polls_pending:
+            if self.reload_requested:
+                self.reload_config()
+            if self.cluster is not None:
+                self.cluster.update()
+            if self.mqtt is not None and self.mqtt.connects != mqtt_connects_seen:
+                mqtt_connects_seen = self.mqtt.connects
+                print_line('MQTT connection re-established', sd_notify=True)
+                reporter.online()
+            if journal_pending and self.mqtt.is_connected() and time() >= self.journal_replay_time:
+                journal_pending = self.journal_replay()
+
+            now = time()
+            while schedule and schedule[0][0] <= now:
+                due, flora_name = heapq.heappop(schedule)
+                flora = flores[flora_name]
+                if not self.owns(flora):
+                    # Polled by another node of the cluster, check again at the next slot
+                    if settings.daemon_enabled:
+                        heapq.heappush(schedule, (self.next_slot(flora_name, due), flora_name))
+                    continue
+                if flora['pinned'] and flora['adapter'] != flora['pinned']:
+                    # Pinned to another adapter by a configuration reload
+                    self.use_adapter(flora_name, flora, flora['pinned'])
+                if settings.scan_enabled and not self.scan_check(flora_name, flora):
+                    # Not in range, a connection attempt would only time out. Check the index again shortly.
+                    self.metrics.count('miflora_polls_deferred_total', sensor=flora_name)
+                    if settings.daemon_enabled:
+                        heapq.heappush(schedule, (min(now + settings.retry_backoff, self.next_slot(flora_name, now)), flora_name))
+                    elif now - self.scan_start < self.scan_grace:
+                        heapq.heappush(schedule, (min(now + settings.retry_backoff, self.scan_start + self.scan_grace), flora_name))
+                    continue
+                self.dispatch_times[flora_name] = due
+                priority = 0 if flora['stats']['health'] == 'healthy' else 1
+                if priority:
+                    self.metrics.count('miflora_retries_total', sensor=flora_name)
+                self.poll_jobs[flora['adapter']].put((priority, next(self.poll_job_sequence), flora_name))
+                self.polls_pending += 1
+            if not schedule and not self.polls_pending:
+                # Single run, the remaining sensors were skipped
+                continue
+
+            # Results arrive in completion order, publish them as soon as they are available
+            deadlines = [schedule[0][0] if schedule else None, reporter.deadline()]
+            deadlines += [component.deadline() for component in [self.snapshot, self.journal, self.cluster] if component is not None]
+            deadlines = [deadline for deadline in deadlines if deadline is not None]
+            if journal_pending and self.mqtt.is_connected():
+                deadlines.append(self.journal_replay_time)
+            try:
+                flora_name, polled_flora, readings, history_position = self.poll_results.get(timeout=max(0, min(deadlines) - time()) if deadlines else None)
+            except Empty:
+                reporter.flush(force=False)
+                if self.snapshot is not None:
+                    self.snapshot.flush(force=False)
+                if self.journal is not None:
+                    self.journal.commit(force=False)
+                continue
+            if flora_name is None:
+                # Woken up for a configuration reload
+                continue
+            self.polls_pending -= 1
+            flora = flores.get(flora_name)
+            if flora is None or flora is not polled_flora:
+                # Removed or replaced by a configuration reload while it was polled
+                continue
+            flora['stats']['count'] += 1
+            self.metrics.count('miflora_polls_total', sensor=flora_name)
+            self.metrics.observe('miflora_poll_seconds', time() - self.dispatch_times[flora_name], sensor=flora_name)
+
+            if readings is None:
+                flora['stats']['failure'] += 1
+                self.metrics.count('miflora_poll_failures_total', sensor=flora_name)
+                reporter.failed(flora_name, flora)
+                print_line('Failed to retrieve data from Mi Flora sensor "{}" ({}), success rate: {:.0%}'.format(
+                    flora['name_pretty'], flora['mac'], flora['stats']['success']/flora['stats']['count']
+                    ), error = True, sd_notify = True)
+            else:
+                flora['stats']['success'] += 1
+                self.update_metadata(flora_name, flora)
+                if settings.history_enabled:
+                    print_line('History of "{}": {} new records'.format(flora['name_pretty'], len(readings)))
+                for [timestamp, data] in readings:
+                    print_line('Result for "{}": {}'.format(flora['name_pretty'], json.dumps(data)))
+                    if self.snapshot is not None:
+                        self.snapshot.add(flora_name, flora, data, timestamp)
+                    data = self.significant_changes(flora, data, timestamp)
+                    if data is None:
+                        print_line('No significant change for "{}", nothing published'.format(flora['name_pretty']))
+                        continue
+                    read_times = {field: read_time for [field, (value, read_time)] in flora['tiers'].items() if field in data}
+                    if self.journal is not None and (journal_pending or not self.mqtt.is_connected()):
+                        # Keep the order of readings, new ones queue up behind those not yet replayed
+                        self.journal.append(flora_name, timestamp, data, read_times)
+                        journal_pending = True
+                        print_line('MQTT broker unreachable, reading of "{}" journaled'.format(flora['name_pretty']), console=False, sd_notify=True)
+                    else:
+                        reporter.publish(flora_name, flora, data, timestamp, read_times, historic=settings.history_enabled)
+                        print_line('Status messages for "{}" published'.format(flora['name_pretty']), console=False, sd_notify=True)
+                # A batch is complete once all readings of a poll, e.g. several history records, were handed over
+                reporter.flush(force=False)
+                if self.snapshot is not None:
+                    self.snapshot.flush(force=False)
+                if history_position is not None and history_position != self.device_state.get(flora['mac'], dict()).get('history_device_time'):
+                    self.device_state.setdefault(flora['mac'], dict())['history_device_time'] = history_position
+                    save_state(self.state_path, self.device_state)
+            print()
+
+            due = self.update_health(flora_name, flora, readings is not None)
+            if settings.daemon_enabled:
+                if time() - self.dispatch_times[flora_name] > flora['refresh']:
+                    # Missed slots are skipped, the sensor stays on its cadence
+                    print_line('Sensor "{}" missed its slot, the period of {} seconds is too short'.format(flora['name_pretty'], flora['refresh']), warning=True)
+                heapq.heappush(schedule, (due, flora_name))
+            elif readings is None and flora['stats']['consecutive_failures'] < self.single_run_attempts:
+                print_line('Retrying sensor "{}" in {} seconds'.format(flora['name_pretty'], settings.retry_backoff), warning=True)
+                heapq.heappush(schedule, (time() + settings.retry_backoff, flora_name))
+
+    # Clean shutdown, wait for outstanding messages before closing the connection
+    def shutdown(self, announce_offline):
+        if self.mqtt is None:
+            return
+        if self.journal is not None:
+            self.journal.close()
+        self.reporter.flush(force=True)
+        if self.snapshot is not None:
+            self.snapshot.flush(force=True)
+        # A clean disconnect suppresses the last will, the reporter publishes its message itself
+        self.reporter.shutdown([flora_name for [flora_name, flora] in self.flores.items() if self.owns(flora)], announce_offline)
+        if self.cluster is not None:
+            self.cluster.leave()
+        self.mqtt.wait_for_publish(self.settings.mqtt_timeout)
+        self.mqtt.disconnect(self.reporter.background_loop)
+
+
+def main():
+    signal(SIGPIPE,SIG_DFL)
+
+    # Argparse
+    parser = argparse.ArgumentParser(description=project_name, epilog='For further details see: ' + project_url)
+    parser.add_argument('--config_dir', help='set directory where config.ini is located', default=sys.path[0])
+    parse_args = parser.parse_args()
+
+    # Intro
+    print_intro()
+
+    # Load configuration file
+    try:
+        config = read_config(parse_args.config_dir)
+    except IOError:
+        print_line('No configuration file "config.ini"', error=True, sd_notify=True)
+        sys.exit(1)
+
+    # Check configuration
+    settings = Settings(config, parse_args.config_dir)
+    try:
+        warnings = settings.check()
+        sensors = parse_sensors(config, settings.used_adapters)
+        deadbands = parse_deadbands(config)
+        snapshot_encode = snapshot_encoder(settings.snapshot_format)
+    except ValueError as e:
+        print_line(str(e), error=True, sd_notify=True)
+        sys.exit(1)
+    for warning in warnings:
+        print_line(warning, warning=True, sd_notify=True)
+
+    print_line('Configuration accepted', console=False, sd_notify=True)
+
+    Daemon(config, settings, sensors, deadbands, snapshot_encode).run()
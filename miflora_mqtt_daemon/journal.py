@@ -0,0 +1,62 @@
+"""Store-and-forward journal, readings taken while the broker is unreachable are kept on disk and replayed later."""
+
+import json
+import sqlite3
+from collections import OrderedDict
+from time import time
+
+
+class Journal:
+    """Readings in an SQLite database, in the order they were taken."""
+    # Readings are replayed in chunks to bound memory use
+    replay_chunk = 100
+
+    def __init__(self, path, settings):
+        self.max_age = settings.journal_max_age
+        self.max_entries = settings.journal_max_entries
+        self.sync_interval = settings.journal_sync_interval
+        self.uncommitted = 0
+        self.last_commit = time()
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS readings (id INTEGER PRIMARY KEY AUTOINCREMENT, flora_name TEXT NOT NULL, '
+                                'timestamp REAL NOT NULL, data TEXT NOT NULL, read_times TEXT NOT NULL)')
+        self.connection.commit()
+
+    def append(self, flora_name, timestamp, data, read_times):
+        self.connection.execute('INSERT INTO readings (flora_name, timestamp, data, read_times) VALUES (?, ?, ?, ?)',
+                                (flora_name, timestamp, json.dumps(data), json.dumps(read_times)))
+        self.uncommitted += 1
+        self.commit(force=False)
+
+    def commit(self, force):
+        # Commits, and with them the writes to disk, are batched
+        if not self.uncommitted or not (force or time() - self.last_commit >= self.sync_interval):
+            return
+        self.connection.execute('DELETE FROM readings WHERE timestamp < ?', (time() - self.max_age, ))
+        self.connection.execute('DELETE FROM readings WHERE id <= (SELECT MAX(id) FROM readings) - ?', (self.max_entries, ))
+        self.connection.commit()
+        self.uncommitted = 0
+        self.last_commit = time()
+
+    def deadline(self):
+        if not self.uncommitted:
+            return None
+        return self.last_commit + self.sync_interval
+
+    def oldest(self):
+        # Returns the oldest chunk of readings as (id, flora_name, timestamp, data, read_times)
+        self.commit(force=True)
+        rows = self.connection.execute('SELECT id, flora_name, timestamp, data, read_times FROM readings ORDER BY id LIMIT ?', (self.replay_chunk, )).fetchall()
+        return [(row_id, flora_name, timestamp, json.loads(data, object_pairs_hook=OrderedDict), json.loads(read_times))
+                for [row_id, flora_name, timestamp, data, read_times] in rows]
+
+    def delete(self, last_id):
+        # Readings stay in the journal until the broker has acknowledged them
+        self.connection.execute('DELETE FROM readings WHERE id <= ?', (last_id, ))
+        self.connection.commit()
+
+    def close(self):
+        self.commit(force=True)
+        self.connection.close()
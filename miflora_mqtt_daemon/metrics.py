@@ -0,0 +1,108 @@
+"""Metrics, served in the Prometheus text format on http://<metrics_address>:<metrics_port>/metrics if enabled."""
+
+import threading
+from collections import OrderedDict
+
+from miflora_mqtt_daemon.console import print_line
+
+metrics_buckets = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+metrics_descriptions = OrderedDict([
+    ('miflora_connect_seconds', ('histogram', 'Time to establish a BLE connection to a sensor')),
+    ('miflora_read_seconds', ('histogram', 'Time a BLE connection to a sensor was kept open for reading')),
+    ('miflora_poll_seconds', ('histogram', 'Time from the due time of a poll to its result, including the wait for the adapter')),
+    ('miflora_mqtt_publish_ack_seconds', ('histogram', 'Time from publishing an MQTT message to its acknowledgement (QoS 0: until sent)')),
+    ('miflora_polls_total', ('counter', 'Polls of a sensor')),
+    ('miflora_poll_failures_total', ('counter', 'Failed polls of a sensor')),
+    ('miflora_retries_total', ('counter', 'Polls of a sensor that retried or probed after a failure')),
+    ('miflora_polls_deferred_total', ('counter', 'Polls of a sensor deferred because the background scan did not see it recently')),
+    ('miflora_adapter_busy_seconds_total', ('counter', 'Time an adapter spent polling sensors')),
+])
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = ['{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for [key, value] in labels]
+    return '{' + ','.join(escaped) + '}'
+
+
+class Metrics:
+    """Histograms and counters recorded by the daemon, gauges are taken from the daemon state when scraped.
+
+    Without a metrics_port nothing is recorded, and the HTTP server module is not even imported.
+    """
+
+    def __init__(self, port, address):
+        self.port = port
+        self.address = address
+        self.lock = threading.Lock()
+        self.values = {name: dict() for name in metrics_descriptions.keys()}
+        # Returns a list of (name, description, [(labels, value)]), set by the daemon
+        self.gauges = lambda: []
+
+    def observe(self, name, value, **labels):
+        if not self.port:
+            return
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.values[name].setdefault(key, [[0] * len(metrics_buckets), 0.0, 0])
+            for index, bound in enumerate(metrics_buckets):
+                if value <= bound:
+                    series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, name, amount=1, **labels):
+        if not self.port:
+            return
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[name][key] = self.values[name].get(key, 0) + amount
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for [name, (kind, description)] in metrics_descriptions.items():
+                lines += ['# HELP {} {}'.format(name, description), '# TYPE {} {}'.format(name, kind)]
+                for [labels, series] in self.values[name].items():
+                    if kind == 'counter':
+                        lines.append('{}{} {}'.format(name, format_labels(labels), series))
+                        continue
+                    for [bound, bucket_count] in zip(metrics_buckets, series[0]):
+                        lines.append('{}_bucket{} {}'.format(name, format_labels(labels + (('le', bound), )), bucket_count))
+                    lines.append('{}_bucket{} {}'.format(name, format_labels(labels + (('le', '+Inf'), )), series[2]))
+                    lines.append('{}_sum{} {}'.format(name, format_labels(labels), series[1]))
+                    lines.append('{}_count{} {}'.format(name, format_labels(labels), series[2]))
+        for [name, description, samples] in self.gauges():
+            lines += ['# HELP {} {}'.format(name, description), '# TYPE {} gauge'.format(name)]
+            lines += ['{}{} {}'.format(name, format_labels(labels), value) for [labels, value] in samples]
+        return '\n'.join(lines) + '\n'
+
+    def serve(self):
+        if not self.port:
+            return
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        render = self.render
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            server = ThreadingHTTPServer((self.address, self.port), MetricsHandler)
+        except OSError as e:
+            print_line('Metrics endpoint could not be started on {}:{}: {}'.format(self.address, self.port, e), error=True, sd_notify=True)
+            return
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+        print_line('Serving metrics on http://{}:{}/metrics'.format(self.address, self.port))
@@ -0,0 +1,52 @@
+"""Xiaomi MiBeacon advertisements (service data of UUID 0xFE95), one measurement per frame."""
+
+import struct
+
+from miflora.miflora_poller import MI_BATTERY, MI_CONDUCTIVITY, MI_LIGHT, MI_MOISTURE, MI_TEMPERATURE
+
+MIBEACON_UUID = b'\x95\xfe'
+mibeacon_objects = {
+    0x1004: (MI_TEMPERATURE, lambda value: int.from_bytes(value[0:2], 'little', signed=True) / 10.0),
+    0x1007: (MI_LIGHT, lambda value: int.from_bytes(value[0:3], 'little')),
+    0x1008: (MI_MOISTURE, lambda value: value[0]),
+    0x1009: (MI_CONDUCTIVITY, lambda value: int.from_bytes(value[0:2], 'little')),
+    0x100a: (MI_BATTERY, lambda value: value[0]),
+}
+
+def decode_mibeacon(frame):
+    # Returns the sender MAC address (if included) and the decoded values of a MiBeacon frame
+    if len(frame) < 5:
+        raise ValueError('MiBeacon frame too short')
+    frame_control, = struct.unpack('<H', frame[0:2])
+    if frame_control & 0x0008:
+        raise ValueError('Encrypted MiBeacon frames are not supported')
+    offset = 5
+    mac = None
+    if frame_control & 0x0010:
+        if len(frame) < offset + 6:
+            raise ValueError('MiBeacon frame truncated')
+        mac = ':'.join('{:02X}'.format(byte) for byte in reversed(frame[offset:offset + 6]))
+        offset += 6
+    if frame_control & 0x0020:
+        if len(frame) <= offset:
+            raise ValueError('MiBeacon frame truncated')
+        # The IO capability follows in two more bytes
+        offset += 3 if frame[offset] & 0x20 else 1
+        if len(frame) < offset:
+            raise ValueError('MiBeacon frame truncated')
+    values = dict()
+    if frame_control & 0x0040:
+        if len(frame) < offset + 3:
+            raise ValueError('MiBeacon object truncated')
+        while offset + 3 <= len(frame):
+            object_type, object_length = struct.unpack('<HB', frame[offset:offset + 3])
+            value = frame[offset + 3:offset + 3 + object_length]
+            if len(value) < object_length:
+                raise ValueError('MiBeacon object truncated')
+            if object_type in mibeacon_objects:
+                param, decode = mibeacon_objects[object_type]
+                values[param] = decode(value)
+            offset += 3 + object_length
+        if offset < len(frame):
+            raise ValueError('MiBeacon object truncated')
+    return mac, values
@@ -0,0 +1,141 @@
+"""MQTT connection with delivery tracking, a thin layer over the Eclipse Paho client."""
+
+import os
+import ssl
+import sys
+import threading
+from time import time
+
+import paho.mqtt.client as mqtt
+
+from miflora_mqtt_daemon.console import print_line
+
+
+class MqttConnection:
+    """One client connection to the broker.
+
+    Unacknowledged messages are kept by message id with their send time and QoS until on_publish, which keeps
+    the number of messages in flight within max_inflight and lets shutdown and the journal wait for delivery.
+    """
+
+    def __init__(self, settings, metrics, will=None):
+        self.settings = settings
+        self.metrics = metrics
+        self.condition = threading.Condition()
+        self.connected = False
+        self.connects = 0
+        self.pending = dict()
+        self.acked_early = set()
+        # Raised while replaying the journal, with QoS 0 a message counts as delivered once written to the socket
+        self.min_qos = 0
+        self.client = mqtt.Client()
+        self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
+        self.client.on_publish = self.on_publish
+        self.client.max_inflight_messages_set(settings.mqtt_inflight)
+        if will is not None:
+            topic, payload, qos, retain = will
+            self.client.will_set(topic, payload=payload, qos=qos, retain=retain)
+
+    # Eclipse Paho callbacks - http://www.eclipse.org/paho/clients/python/docs/#callbacks
+    def on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            print_line('MQTT connection established', console=True, sd_notify=True)
+            print()
+            with self.condition:
+                self.connected = True
+                self.connects += 1
+                self.condition.notify_all()
+        else:
+            print_line('Connection error with result code {} - {}'.format(str(rc), mqtt.connack_string(rc)), error=True)
+            #kill main thread
+            os._exit(1)
+
+    def on_disconnect(self, client, userdata, rc):
+        with self.condition:
+            self.connected = False
+            self.condition.notify_all()
+        if rc != 0:
+            print_line('MQTT connection lost, reconnecting ...', warning=True, sd_notify=True)
+
+    def on_publish(self, client, userdata, mid):
+        # Paho may invoke this before publish() has returned the message id, remember those acknowledgements
+        with self.condition:
+            sent = self.pending.pop(mid, None)
+            if sent is None:
+                self.acked_early.add(mid)
+            self.condition.notify_all()
+        if sent is not None:
+            self.metrics.observe('miflora_mqtt_publish_ack_seconds', time() - sent[0], qos=sent[1])
+
+    def connect(self, background_loop=True):
+        mqtt_config = self.settings.mqtt
+        try:
+            if mqtt_config.getboolean('tls', False):
+                # According to the docs, setting PROTOCOL_SSLv23 "Selects the highest protocol version
+                # that both the client and server support. Despite the name, this option can select
+                # “TLS” protocols as well as “SSL”" - so this seems like a resonable default
+                self.client.tls_set(
+                    ca_certs=mqtt_config.get('tls_ca_cert', None),
+                    keyfile=mqtt_config.get('tls_keyfile', None),
+                    certfile=mqtt_config.get('tls_certfile', None),
+                    tls_version=ssl.PROTOCOL_SSLv23
+                )
+
+            mqtt_username = os.environ.get("MQTT_USERNAME", mqtt_config.get('username'))
+            mqtt_password = os.environ.get("MQTT_PASSWORD", mqtt_config.get('password', None))
+
+            if mqtt_username:
+                self.client.username_pw_set(mqtt_username, mqtt_password)
+            self.client.connect(os.environ.get('MQTT_HOSTNAME', mqtt_config.get('hostname', 'localhost')),
+                                port=int(os.environ.get('MQTT_PORT', mqtt_config.get('port', '1883'))),
+                                keepalive=mqtt_config.getint('keepalive', 60))
+        except:
+            print_line('MQTT connection error. Please check your settings in the configuration file "config.ini"', error=True, sd_notify=True)
+            sys.exit(1)
+        if background_loop:
+            self.client.loop_start()
+
+    def wait_for_connection(self):
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.connected, timeout=self.settings.mqtt_timeout):
+                print_line('No MQTT connection after {} seconds, continuing in the background'.format(self.settings.mqtt_timeout), warning=True, sd_notify=True)
+
+    def is_connected(self):
+        with self.condition:
+            return self.connected
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        # Keep the number of unacknowledged messages within the in-flight window while connected
+        inflight, timeout = self.settings.mqtt_inflight, self.settings.mqtt_timeout
+        qos = max(qos, self.min_qos)
+        with self.condition:
+            if len(self.pending) >= inflight and self.connected:
+                if not self.condition.wait_for(lambda: len(self.pending) < inflight or not self.connected, timeout=timeout):
+                    print_line('{} MQTT messages still unacknowledged after {} seconds'.format(len(self.pending), timeout), warning=True)
+        sent = time()
+        info = self.client.publish(topic, payload, qos, retain)
+        if info.rc == mqtt.MQTT_ERR_SUCCESS or (qos > 0 and info.rc == mqtt.MQTT_ERR_NO_CONN):
+            with self.condition:
+                if info.mid in self.acked_early:
+                    self.acked_early.discard(info.mid)
+                    self.metrics.observe('miflora_mqtt_publish_ack_seconds', time() - sent, qos=qos)
+                else:
+                    self.pending[info.mid] = (sent, qos)
+        return info
+
+    def unacknowledged(self):
+        with self.condition:
+            return len(self.pending)
+
+    def wait_for_publish(self, timeout):
+        with self.condition:
+            if not self.condition.wait_for(lambda: not self.pending, timeout=timeout):
+                print_line('{} MQTT messages could not be delivered within {} seconds'.format(len(self.pending), timeout), warning=True)
+                return False
+        return True
+
+    def disconnect(self, background_loop=True):
+        self.client.disconnect()
+        if background_loop:
+            self.client.loop_stop()
@@ -0,0 +1,13 @@
+"""The measured parameters of the Mi Flora sensor and their properties."""
+
+from collections import OrderedDict
+
+from miflora.miflora_poller import MI_BATTERY, MI_CONDUCTIVITY, MI_LIGHT, MI_MOISTURE, MI_TEMPERATURE
+
+parameters = OrderedDict([
+    (MI_LIGHT, dict(name="LightIntensity", name_pretty='Sunlight Intensity', typeformat='%d', unit='lx', value_range='0:50000', device_class="illuminance", state_class="measurement")),
+    (MI_TEMPERATURE, dict(name="AirTemperature", name_pretty='Air Temperature', typeformat='%.1f', unit='°C', value_range='*', device_class="temperature", state_class="measurement")),
+    (MI_MOISTURE, dict(name="SoilMoisture", name_pretty='Soil Moisture', typeformat='%d', unit='%', value_range='0:100', device_class="humidity", state_class="measurement")),
+    (MI_CONDUCTIVITY, dict(name="SoilConductivity", name_pretty='Soil Conductivity/Fertility', typeformat='%d', unit='µS/cm', value_range='0:*', state_class="measurement")),
+    (MI_BATTERY, dict(name="Battery", name_pretty='Sensor Battery Level', typeformat='%d', unit='%', value_range='0:100', device_class="battery", state_class="measurement"))
+])
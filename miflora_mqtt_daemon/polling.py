@@ -0,0 +1,159 @@
+"""Sensor data retrieval via bluetooth connections, and from advertisements in passive mode."""
+
+from collections import OrderedDict
+from datetime import datetime
+from time import time
+
+from miflora.miflora_poller import MI_BATTERY, MI_LIGHT
+from miflora.miflora_poller import HistoryEntry, BYTEORDER, _HANDLE_DEVICE_TIME, _HANDLE_HISTORY_CONTROL, _HANDLE_HISTORY_READ, _CMD_HISTORY_READ_INIT, _INVALID_HISTORY_DATA
+
+from miflora_mqtt_daemon.console import print_line
+from miflora_mqtt_daemon.parameters import parameters
+
+# History sync, records are identified by the device time they were taken at, the log index shifts with every new record
+def read_history_entry(connection, index):
+    connection.write_handle(_HANDLE_HISTORY_CONTROL, b'\xa1' + index.to_bytes(2, BYTEORDER))
+    response = connection.read_handle(_HANDLE_HISTORY_READ)
+    if response in _INVALID_HISTORY_DATA:
+        return None
+    return HistoryEntry(response)
+
+
+class FloraReader:
+    """Reads the sensors, called from the worker thread of their adapter while holding its lock."""
+
+    def __init__(self, settings, errors, index, adapter_locks):
+        self.slow_field_periods = settings.slow_field_periods
+        self.history_backfill = settings.history_backfill
+        # The exceptions of a failed connection, depending on the bluetooth backend
+        self.errors = errors
+        self.index = index
+        self.adapter_locks = adapter_locks
+
+    # Slowly changing fields, battery level and firmware share one characteristic which is only read when one of them is due
+    def record_slow_fields(self, flora):
+        now = time()
+        flora['tiers'][MI_BATTERY] = (flora['poller'].battery, now)
+        flora['tiers']['firmware'] = (flora['poller']._firmware_version, now)
+        if flora['poller']._firmware_version and flora['firmware'] != flora['poller']._firmware_version:
+            flora['firmware'] = flora['poller']._firmware_version
+
+    def slow_fields_due(self, flora):
+        return [field for [field, period] in self.slow_field_periods.items() if time() - flora['tiers'].get(field, (None, 0))[1] >= period]
+
+    def refresh_slow_fields(self, flora):
+        poller = flora['poller']
+        if self.slow_fields_due(flora) or poller._firmware_version is None:
+            poller._firmware_version = None
+            poller.firmware_version()
+            self.record_slow_fields(flora)
+            if flora['device_name'] is None:
+                flora['device_name'] = poller.name()
+        else:
+            # Keep the poller from reading the characteristic on its own, it would do so once a day
+            poller._fw_last_read = datetime.now()
+
+    def poll(self, flora):
+        data = OrderedDict()
+        flora['poller']._cache = None
+        flora['poller']._last_read = None
+        print_line('Retrieving data from sensor "{}" via {} ...'.format(flora['name_pretty'], flora['adapter']))
+        # A single attempt, failed polls are rescheduled with backoff by the main loop
+        try:
+            self.refresh_slow_fields(flora)
+            flora['poller'].fill_cache()
+            flora['poller'].parameter_value(MI_LIGHT)
+        except self.errors as e:
+            if len(str(e)) > 0:
+                print_line('Polling sensor "{}" failed due to exception: {}'.format(flora['name_pretty'], e), error=True)
+            flora['poller']._cache = None
+            flora['poller']._last_read = None
+
+        if not flora['poller']._cache:
+            return None
+        try:
+            for param,_ in parameters.items():
+                if param in flora['tiers']:
+                    data[param] = flora['tiers'][param][0]
+                else:
+                    data[param] = flora['poller'].parameter_value(param)
+        except self.errors as e:
+            print_line('Reading parameters failed due to exception: {}'.format(e), error=True)
+            return None
+        return data
+
+    def sync_history(self, flora, last_synced):
+        # Downloads all records of the hourly log since the last synced one in a single connection.
+        # Returns the new records as a chronological list of (timestamp, data) and the device time of the newest.
+        print_line('Downloading history of sensor "{}" via {} ...'.format(flora['name_pretty'], flora['adapter']))
+        try:
+            self.refresh_slow_fields(flora)
+            entries = []
+            with flora['poller']._bt_interface.connect(flora['mac']) as connection:
+                request_time = time()
+                device_time = int.from_bytes(connection.read_handle(_HANDLE_DEVICE_TIME), BYTEORDER)
+                time_offset = (request_time + time()) / 2 - device_time
+                if last_synced is not None and last_synced > device_time:
+                    # The clock of the sensor restarts with a new battery, so does its log
+                    last_synced = None
+                connection.write_handle(_HANDLE_HISTORY_CONTROL, _CMD_HISTORY_READ_INIT)
+                history_length = int.from_bytes(connection.read_handle(_HANDLE_HISTORY_READ)[0:2], BYTEORDER)
+                # Walk from the newest record back until the last synced one or the backfill limit is reached
+                indexes = list(range(history_length))
+                if history_length > 1:
+                    first, last = read_history_entry(connection, 0), read_history_entry(connection, history_length - 1)
+                    if first is not None and last is not None and first.device_time < last.device_time:
+                        indexes.reverse()
+                for index in indexes:
+                    entry = read_history_entry(connection, index)
+                    if entry is None:
+                        continue
+                    if last_synced is not None and entry.device_time <= last_synced:
+                        break
+                    if device_time - entry.device_time > self.history_backfill * 3600:
+                        break
+                    entries.append(entry)
+        except self.errors as e:
+            print_line('Downloading history of sensor "{}" failed due to exception: {}'.format(flora['name_pretty'], e), error=True)
+            return None, None
+
+        readings = []
+        for entry in reversed(entries):
+            data = OrderedDict()
+            for param in parameters.keys():
+                if param != MI_BATTERY:
+                    data[param] = getattr(entry, param)
+            readings.append((entry.device_time + time_offset, data))
+        # The log has no battery level, it is added to the newest record
+        if readings and MI_BATTERY in flora['tiers']:
+            readings[-1][1][MI_BATTERY] = flora['tiers'][MI_BATTERY][0]
+        return readings, entries[0].device_time if entries else last_synced
+
+    def read_passive(self, flora):
+        # Takes the adapter lock only if a connection is needed
+        received = self.index.received(flora['mac'])
+        fresh = {param: value for [param, (value, timestamp)] in received.items() if time() - timestamp < flora['refresh']}
+        if MI_BATTERY in fresh:
+            flora['tiers'][MI_BATTERY] = received[MI_BATTERY]
+        missing = [param for param in parameters.keys() if param != MI_BATTERY and param not in fresh]
+        if missing:
+            print_line('No recent advertisement of {} from sensor "{}", polling instead'.format(', '.join(missing), flora['name_pretty']), warning=True)
+            with self.adapter_locks[flora['adapter']]:
+                return self.poll(flora)
+
+        # The firmware is never advertised, the battery level only by some firmware versions, read them via a connection when due
+        due = [field for field in self.slow_fields_due(flora) if field not in fresh]
+        if due:
+            try:
+                with self.adapter_locks[flora['adapter']]:
+                    self.refresh_slow_fields(flora)
+            except self.errors as e:
+                print_line('Reading {} of sensor "{}" failed due to exception: {}'.format(' and '.join(due), flora['name_pretty'], e), warning=True)
+
+        data = OrderedDict()
+        for param in parameters.keys():
+            if param in fresh:
+                data[param] = fresh[param]
+            elif param in flora['tiers']:
+                data[param] = flora['tiers'][param][0]
+        return data
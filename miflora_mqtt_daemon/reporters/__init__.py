@@ -0,0 +1,28 @@
+"""Output formats of the daemon, selected by "reporting_method" in config.ini.
+
+A new format is a subclass of Reporter registered here, the polling loop itself does not change.
+"""
+
+from collections import OrderedDict
+
+from miflora_mqtt_daemon.reporters.base import Reporter
+from miflora_mqtt_daemon.reporters.gladys import GladysReporter
+from miflora_mqtt_daemon.reporters.homeassistant import HomeAssistantReporter
+from miflora_mqtt_daemon.reporters.homie import HomieReporter
+from miflora_mqtt_daemon.reporters.mqtt_json import MqttJsonReporter
+from miflora_mqtt_daemon.reporters.smarthome import SmarthomeReporter
+from miflora_mqtt_daemon.reporters.stdout import StdoutReporter
+from miflora_mqtt_daemon.reporters.thingsboard import ThingsboardGatewayReporter, ThingsboardJsonReporter
+from miflora_mqtt_daemon.reporters.wirenboard import WirenboardReporter
+
+reporter_classes = OrderedDict([
+    ('mqtt-json', MqttJsonReporter),
+    ('mqtt-homie', HomieReporter),
+    ('json', StdoutReporter),
+    ('mqtt-smarthome', SmarthomeReporter),
+    ('homeassistant-mqtt', HomeAssistantReporter),
+    ('gladys-mqtt', GladysReporter),
+    ('thingsboard-json', ThingsboardJsonReporter),
+    ('thingsboard-gateway', ThingsboardGatewayReporter),
+    ('wirenboard-mqtt', WirenboardReporter),
+])
@@ -0,0 +1,94 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from time import localtime, strftime
+
+from miflora_mqtt_daemon.console import print_line
+
+
+class Reporter(ABC):
+    """Base class of the output formats, one reporter instance serves all sensors.
+
+    Sensors are registered with add() and unregistered with remove(), which is the place to compute their
+    topics and the static parts of their payloads once. announce() is called once at startup, discover()
+    whenever the metadata of sensors changed, publish() for every reading. Batching reporters send their
+    messages in flush(), the main loop calls it after the readings of every poll and by the time returned by deadline().
+    """
+    # Base topic unless configured in [MQTT]
+    default_base_topic = 'miflora'
+    # Whether the reporter publishes via MQTT, and whether the MQTT client runs its network loop in the background
+    uses_mqtt = True
+    background_loop = True
+    # Reporters publishing one message per value only publish the changed values with deadbands configured
+    per_value = False
+    # Reporters with a JSON payload per reading add the original time to readings from the past
+    historic_timestamp = False
+    # Whether the fleet snapshot may be published in addition
+    snapshots = True
+
+    def __init__(self, mqtt, settings):
+        self.mqtt = mqtt
+        self.settings = settings
+        self.base_topic = settings.base_topic
+        self.flores = OrderedDict()
+        # Whether this node polls a sensor, replaced by the daemon in cluster mode
+        self.owns = lambda flora: True
+        # Interval of the republication of unchanged values with deadbands configured, None without, set by the daemon
+        self.heartbeat = None
+
+    def will(self):
+        # The last will as (topic, payload, qos, retain), published by the broker if the connection is lost
+        return None
+
+    def online(self):
+        # After (re)connecting, republish what the last will has overwritten
+        pass
+
+    def add(self, flora_name, flora):
+        self.flores[flora_name] = flora
+
+    def remove(self, flora_name, flora):
+        # The sensor was removed from the configuration, retained messages are cleared so that consumers forget it
+        del self.flores[flora_name]
+
+    def announce(self, flora_names):
+        print_line('Announcing Mi Flora devices to MQTT broker for auto-discovery ...')
+        self.discover(flora_names)
+
+    def discover(self, flora_names):
+        pass
+
+    @abstractmethod
+    def publish(self, flora_name, flora, data, timestamp, read_times, historic=False):
+        pass
+
+    def deadbands_changed(self):
+        # Returns the sensors to announce again after the deadbands were reloaded
+        return []
+
+    def failed(self, flora_name, flora):
+        # A poll of the sensor failed
+        pass
+
+    def taken_over(self, flora_name, flora):
+        # In cluster mode this node took over the sensor, the previous owner may have published another state
+        pass
+
+    def flush(self, force):
+        pass
+
+    def deadline(self):
+        return None
+
+    def shutdown(self, flora_names, announce_offline):
+        # Offline messages for the given sensors, a clean disconnect suppresses the last will
+        pass
+
+    def payload(self, data, timestamp, read_times, historic):
+        # Values of the slow tiers are reused between reads, JSON payloads state their age in seconds
+        payload_data = OrderedDict(data)
+        for [field, read_time] in read_times.items():
+            payload_data['{}_age'.format(field)] = int(timestamp - read_time)
+        # Readings from the past carry their original time
+        if historic and self.historic_timestamp:
+            payload_data['timestamp'] = strftime('%Y-%m-%dT%H:%M:%S%z', localtime(timestamp))
+        return payload_data
@@ -0,0 +1,36 @@
+from miflora_mqtt_daemon.console import print_line
+from miflora_mqtt_daemon.parameters import parameters
+from miflora_mqtt_daemon.reporters.base import Reporter
+
+
+class GladysReporter(Reporter):
+    """Gladys Assistant MQTT integration, one retained message per value on the state topic of the device feature.
+
+    Gladys has no auto-discovery, the devices are created in its MQTT integration with the external IDs
+    mqtt:miflora:<sensor> and the features with mqtt:<param>.
+    """
+    default_base_topic = 'gladys/master/device'
+    per_value = True
+
+    def __init__(self, mqtt, settings):
+        super().__init__(mqtt, settings)
+        self.topics = dict()
+
+    def add(self, flora_name, flora):
+        super().add(flora_name, flora)
+        topic_path = '{}/mqtt:miflora:{}/feature'.format(self.base_topic, flora_name.lower())
+        self.topics[flora_name] = {param: '{}/mqtt:{}/state'.format(topic_path, param) for param in parameters.keys()}
+
+    def remove(self, flora_name, flora):
+        super().remove(flora_name, flora)
+        for topic in self.topics.pop(flora_name).values():
+            self.mqtt.publish(topic, '', 1, True)
+
+    def announce(self, flora_names):
+        pass
+
+    def publish(self, flora_name, flora, data, timestamp, read_times, historic=False):
+        topics = self.topics[flora_name]
+        for [param, value] in data.items():
+            print_line('Publishing data to MQTT topic "{}"'.format(topics[param]))
+            self.mqtt.publish(topics[param], value, 1, True)
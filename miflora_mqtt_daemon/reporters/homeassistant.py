@@ -0,0 +1,68 @@
+import json
+from collections import OrderedDict
+
+from miflora_mqtt_daemon.console import print_line
+from miflora_mqtt_daemon.parameters import parameters
+from miflora_mqtt_daemon.reporters.base import Reporter
+
+
+class HomeAssistantReporter(Reporter):
+    """Home Assistant MQTT discovery, one entity per parameter fed from a retained JSON state message per sensor."""
+    default_base_topic = 'homeassistant'
+    historic_timestamp = True
+
+    def __init__(self, mqtt, settings):
+        super().__init__(mqtt, settings)
+        self.topics = dict()
+
+    def add(self, flora_name, flora):
+        super().add(flora_name, flora)
+        self.topics[flora_name] = {
+            'state': '{}/sensor/{}/state'.format(self.base_topic, flora_name.lower()),
+            'discovery': {param: 'homeassistant/sensor/{}/{}/config'.format(flora_name.lower(), param) for param in parameters.keys()},
+        }
+
+    def remove(self, flora_name, flora):
+        super().remove(flora_name, flora)
+        topics = self.topics.pop(flora_name)
+        for topic in topics['discovery'].values():
+            self.mqtt.publish(topic, '', 1, True)
+        self.mqtt.publish(topics['state'], '', 1, True)
+
+    def deadbands_changed(self):
+        # The expiry of the entities depends on the deadbands, all sensors are announced again
+        return list(self.flores.keys())
+
+    def discover(self, flora_names):
+        for flora_name in flora_names:
+            flora = self.flores[flora_name]
+            topics = self.topics[flora_name]
+            device = {
+                    'identifiers' : ["MiFlora{}".format(flora['mac'].lower().replace(":", ""))],
+                    'connections' : [["mac", flora['mac'].lower()]],
+                    'manufacturer' : 'Xiaomi',
+                    'name' : flora_name,
+                    'model' : 'MiFlora Plant Sensor (HHCCJCY01)',
+                    'sw_version': flora['firmware']
+            }
+            # With deadbands, unchanged values are only republished by the heartbeat at the next poll
+            max_silence = flora['refresh'] + self.heartbeat if self.heartbeat is not None else flora['refresh']
+            for [sensor, params] in parameters.items():
+                payload = OrderedDict()
+                payload['name'] = "{}".format(sensor.title())
+                payload['unique_id'] = "{}-{}".format(flora['mac'].lower().replace(":", ""), sensor)
+                payload['unit_of_measurement'] = params['unit']
+                if 'device_class' in params:
+                    payload['device_class'] = params['device_class']
+                if 'state_class' in params:
+                    payload['state_class'] = params['state_class']
+                payload['state_topic'] = topics['state']
+                payload['value_template'] = "{{{{ value_json.{} }}}}".format(sensor)
+                payload['device'] = device
+                payload['expire_after'] = str(int(max_silence * 1.5))
+                self.mqtt.publish(topics['discovery'][sensor], json.dumps(payload), 1, True)
+
+    def publish(self, flora_name, flora, data, timestamp, read_times, historic=False):
+        topic = self.topics[flora_name]['state']
+        print_line('Publishing to MQTT topic "{}"'.format(topic))
+        self.mqtt.publish(topic, json.dumps(self.payload(data, timestamp, read_times, historic)), retain=True)
@@ -0,0 +1,122 @@
+from time import localtime, strftime
+
+from miflora_mqtt_daemon import project_name
+from miflora_mqtt_daemon.console import print_line
+from miflora_mqtt_daemon.parameters import parameters
+from miflora_mqtt_daemon.reporters.base import Reporter
+
+# Homie convention, the node attributes are identical for all devices and derived from the parameters table,
+# light has always been published in "lux" here
+homie_units = {'light': 'lux'}
+homie_node_attributes = [('sensor/$name', 'miflora'), ('sensor/$properties', ','.join(sorted(parameters.keys())))]
+for param in sorted(parameters.keys()):
+    homie_node_attributes += [
+        ('sensor/{}/$name'.format(param), param),
+        ('sensor/{}/$settable'.format(param), 'false'),
+        ('sensor/{}/$unit'.format(param), homie_units.get(param, parameters[param]['unit'])),
+        ('sensor/{}/$datatype'.format(param), 'integer' if parameters[param]['typeformat'] == '%d' else 'float'),
+        ('sensor/{}/$format'.format(param), parameters[param]['value_range']),
+        ('sensor/{}/$retained'.format(param), 'true'),
+    ]
+
+def homie_device_attributes(flora):
+    return [
+        ('$homie', '3.0'),
+        ('$name', flora['name_pretty']),
+        ('$mac', flora['mac']),
+        ('$stats', 'interval,timestamp'),
+        ('$stats/interval', flora['refresh']),
+        ('$stats/timestamp', strftime('%Y-%m-%dT%H:%M:%S%z', localtime())),
+        ('$fw/name', 'miflora-firmware'),
+        ('$fw/version', flora['firmware']),
+        ('$nodes', 'sensor'),
+    ]
+
+
+class HomieReporter(Reporter):
+    """One Homie 3.0 device per sensor, the shared MQTT connection is represented by the daemon's own bridge device.
+
+    The connection has only one last will, which sets the bridge device "lost". The device states are published
+    again whenever the connection is re-established, and every run ends with the devices "disconnected".
+    """
+    default_base_topic = 'homie'
+    per_value = True
+
+    def __init__(self, mqtt, settings):
+        super().__init__(mqtt, settings)
+        # In cluster mode every node has its own bridge device
+        self.bridge_topic = '{}/miflora-mqtt-daemon'.format(self.base_topic)
+        if settings.cluster_enabled:
+            self.bridge_topic = '{}-{}'.format(self.bridge_topic, settings.cluster_node_id)
+        self.topics = dict()
+        self.states = dict()
+
+    def will(self):
+        return ('{}/$state'.format(self.bridge_topic), 'lost', 1, True)
+
+    def online(self):
+        self.mqtt.publish('{}/$state'.format(self.bridge_topic), 'ready', 1, True)
+        # The device states may be stale after the connection was lost, e.g. "ready" left behind by a crash
+        for [flora_name, state] in list(self.states.items()):
+            del self.states[flora_name]
+            self.set_state(flora_name, state)
+
+    def add(self, flora_name, flora):
+        super().add(flora_name, flora)
+        topic_path = '{}/{}'.format(self.base_topic, flora_name.lower())
+        self.topics[flora_name] = {
+            'path': topic_path,
+            'state': '{}/$state'.format(topic_path),
+            'timestamp': '{}/$stats/timestamp'.format(topic_path),
+            'values': {param: '{}/sensor/{}'.format(topic_path, param) for param in parameters.keys()},
+        }
+
+    def remove(self, flora_name, flora):
+        super().remove(flora_name, flora)
+        topics = self.topics.pop(flora_name)
+        self.states.pop(flora_name, None)
+        attributes = [attribute for [attribute, _] in homie_device_attributes(flora) + homie_node_attributes]
+        for attribute in attributes + ['sensor/{}'.format(param) for param in parameters.keys()] + ['$state']:
+            self.mqtt.publish('{}/{}'.format(topics['path'], attribute), '', 1, True)
+
+    def set_state(self, flora_name, state):
+        if self.states.get(flora_name) != state:
+            self.states[flora_name] = state
+            self.mqtt.publish(self.topics[flora_name]['state'], state, 1, True)
+
+    def announce(self, flora_names):
+        print_line('Announcing Mi Flora devices to MQTT broker for auto-discovery ...')
+        for [attribute, value] in [('$homie', '3.0'), ('$name', project_name), ('$nodes', ''), ('$state', 'ready')]:
+            self.mqtt.publish('{}/{}'.format(self.bridge_topic, attribute), value, 1, True)
+        self.discover(flora_names)
+        self.mqtt.wait_for_publish(self.settings.mqtt_timeout)
+
+    def discover(self, flora_names):
+        for flora_name in flora_names:
+            flora = self.flores[flora_name]
+            self.states.pop(flora_name, None)
+            self.set_state(flora_name, 'init')
+            for [attribute, value] in homie_device_attributes(flora) + homie_node_attributes:
+                self.mqtt.publish('{}/{}'.format(self.topics[flora_name]['path'], attribute), value, 1, True)
+            self.set_state(flora_name, 'ready')
+
+    def publish(self, flora_name, flora, data, timestamp, read_times, historic=False):
+        topics = self.topics[flora_name]
+        print_line('Publishing data to MQTT base topic "{}"'.format(topics['path']))
+        self.set_state(flora_name, 'ready')
+        for [param, value] in data.items():
+            self.mqtt.publish(topics['values'][param], value, 1, True)
+        self.mqtt.publish(topics['timestamp'], strftime('%Y-%m-%dT%H:%M:%S%z', localtime(timestamp)), 1, True)
+
+    def failed(self, flora_name, flora):
+        self.set_state(flora_name, 'disconnected')
+
+    def taken_over(self, flora_name, flora):
+        # The previous owner may have marked the device disconnected, publish its state again
+        self.states.pop(flora_name, None)
+
+    def shutdown(self, flora_names, announce_offline):
+        # Also in non-daemon mode, the devices are only ready while the daemon is running
+        for flora_name in flora_names:
+            self.set_state(flora_name, 'disconnected')
+        self.mqtt.publish('{}/$state'.format(self.bridge_topic), 'disconnected', 1, True)
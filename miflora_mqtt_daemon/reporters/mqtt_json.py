@@ -0,0 +1,50 @@
+import json
+from collections import OrderedDict
+
+from miflora_mqtt_daemon.console import print_line
+from miflora_mqtt_daemon.reporters.base import Reporter
+
+# Sensor properties listed in the announcement
+announced_keys = ['name_pretty', 'mac', 'adapter', 'refresh', 'location_clean', 'location_pretty', 'firmware', 'device_name']
+
+
+class MqttJsonReporter(Reporter):
+    """One JSON message per reading on <base_topic>/<sensor>, all sensors are announced on <base_topic>/$announce."""
+    historic_timestamp = True
+
+    def __init__(self, mqtt, settings):
+        super().__init__(mqtt, settings)
+        self.announce_topic = '{}/$announce'.format(self.base_topic)
+        self.topics = dict()
+
+    def will(self):
+        return (self.announce_topic, '{}', 0, True)
+
+    def online(self):
+        self.discover(self.flores.keys())
+
+    def add(self, flora_name, flora):
+        super().add(flora_name, flora)
+        self.topics[flora_name] = '{}/{}'.format(self.base_topic, flora_name)
+
+    def remove(self, flora_name, flora):
+        super().remove(flora_name, flora)
+        del self.topics[flora_name]
+        self.discover(self.flores.keys())
+
+    def discover(self, flora_names):
+        # The announcement always lists all sensors
+        flores_info = dict()
+        for [flora_name, flora] in self.flores.items():
+            flora_info = OrderedDict((key, flora[key]) for key in announced_keys)
+            flora_info['topic'] = self.topics[flora_name]
+            flores_info[flora_name] = flora_info
+        self.mqtt.publish(self.announce_topic, json.dumps(flores_info), retain=True)
+
+    def publish(self, flora_name, flora, data, timestamp, read_times, historic=False):
+        print_line('Publishing to MQTT topic "{}"'.format(self.topics[flora_name]))
+        self.mqtt.publish(self.topics[flora_name], json.dumps(self.payload(data, timestamp, read_times, historic)))
+
+    def shutdown(self, flora_names, announce_offline):
+        if announce_offline:
+            self.mqtt.publish(self.announce_topic, payload='{}', retain=True)
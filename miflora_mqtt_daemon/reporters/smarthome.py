@@ -0,0 +1,47 @@
+import json
+
+from miflora_mqtt_daemon.console import print_line
+from miflora_mqtt_daemon.parameters import parameters
+from miflora_mqtt_daemon.reporters.base import Reporter
+
+
+class SmarthomeReporter(Reporter):
+    """One retained message per value following the mqtt-smarthome architecture, <base_topic>/status/<sensor>/<param>."""
+    per_value = True
+
+    def __init__(self, mqtt, settings):
+        super().__init__(mqtt, settings)
+        self.connected_topic = '{}/connected'.format(self.base_topic)
+        self.topics = dict()
+
+    def will(self):
+        return (self.connected_topic, '0', 0, True)
+
+    def online(self):
+        self.mqtt.publish(self.connected_topic, payload='1', retain=True)
+
+    def add(self, flora_name, flora):
+        super().add(flora_name, flora)
+        self.topics[flora_name] = {param: '{}/status/{}/{}'.format(self.base_topic, flora_name, param) for param in parameters.keys()}
+
+    def remove(self, flora_name, flora):
+        super().remove(flora_name, flora)
+        for topic in self.topics.pop(flora_name).values():
+            self.mqtt.publish(topic, '', 1, True)
+
+    def announce(self, flora_names):
+        self.online()
+        super().announce(flora_names)
+
+    def publish(self, flora_name, flora, data, timestamp, read_times, historic=False):
+        topics = self.topics[flora_name]
+        for [param, value] in data.items():
+            print_line('Publishing data to MQTT topic "{}"'.format(topics[param]))
+            payload = dict()
+            payload['val'] = value
+            payload['ts'] = int(round(read_times.get(param, timestamp) * 1000))
+            self.mqtt.publish(topics[param], json.dumps(payload), retain=True)
+
+    def shutdown(self, flora_names, announce_offline):
+        if announce_offline:
+            self.mqtt.publish(self.connected_topic, payload='0', retain=True)
@@ -0,0 +1,22 @@
+import json
+from time import localtime, strftime
+
+from miflora_mqtt_daemon.reporters.base import Reporter
+
+
+class StdoutReporter(Reporter):
+    """One line of JSON per reading on the console, without an MQTT broker."""
+    uses_mqtt = False
+    snapshots = False
+
+    def announce(self, flora_names):
+        pass
+
+    def publish(self, flora_name, flora, data, timestamp, read_times, historic=False):
+        payload_data = self.payload(data, timestamp, read_times, historic)
+        payload_data['timestamp'] = strftime('%Y-%m-%d %H:%M:%S', localtime(timestamp))
+        payload_data['name'] = flora_name
+        payload_data['name_pretty'] = flora['name_pretty']
+        payload_data['mac'] = flora['mac']
+        payload_data['firmware'] = flora['firmware']
+        print('Data for "{}": {}'.format(flora_name, json.dumps(payload_data)))
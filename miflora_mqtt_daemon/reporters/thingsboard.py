@@ -0,0 +1,79 @@
+import json
+from collections import OrderedDict
+from time import time
+
+from miflora_mqtt_daemon.console import print_line
+from miflora_mqtt_daemon.reporters.base import Reporter
+
+
+class ThingsboardJsonReporter(Reporter):
+    """One ThingsBoard device per sensor, the sensor name is the access token of its device."""
+    default_base_topic = 'v1/devices/me/telemetry'
+    # Every reading reconnects with the credentials of its device
+    background_loop = False
+    snapshots = False
+
+    def announce(self, flora_names):
+        pass
+
+    def publish(self, flora_name, flora, data, timestamp, read_times, historic=False):
+        print_line('Publishing to MQTT topic "{}" username "{}"'.format(self.base_topic, flora_name))
+        self.mqtt.client.username_pw_set(flora_name)
+        self.mqtt.client.reconnect()
+        self.mqtt.publish(self.base_topic, json.dumps(self.payload(data, timestamp, read_times, historic)))
+
+
+class ThingsboardGatewayReporter(Reporter):
+    """All sensors as devices of one ThingsBoard gateway, the readings of all sensors are combined into one message."""
+    default_base_topic = 'v1/gateway'
+    snapshots = False
+
+    def __init__(self, mqtt, settings):
+        super().__init__(mqtt, settings)
+        self.connect_topic = '{}/connect'.format(self.base_topic)
+        self.disconnect_topic = '{}/disconnect'.format(self.base_topic)
+        self.attributes_topic = '{}/attributes'.format(self.base_topic)
+        self.telemetry_topic = '{}/telemetry'.format(self.base_topic)
+        self.batch = OrderedDict()
+        self.batch_start = None
+
+    def remove(self, flora_name, flora):
+        super().remove(flora_name, flora)
+        self.batch.pop(flora_name, None)
+        self.mqtt.publish(self.disconnect_topic, json.dumps({'device': flora_name}), 1)
+
+    def announce(self, flora_names):
+        print_line('Announcing Mi Flora devices to ThingsBoard gateway ...')
+        self.discover(flora_names)
+
+    def discover(self, flora_names):
+        attributes = OrderedDict()
+        for flora_name in flora_names:
+            flora = self.flores[flora_name]
+            self.mqtt.publish(self.connect_topic, json.dumps({'device': flora_name, 'type': 'MiFlora'}), 1)
+            attributes[flora_name] = {'name_pretty': flora['name_pretty'], 'location': flora['location_pretty'], 'mac': flora['mac'], 'firmware': flora['firmware']}
+        self.mqtt.publish(self.attributes_topic, json.dumps(attributes), 1)
+
+    def publish(self, flora_name, flora, data, timestamp, read_times, historic=False):
+        self.batch.setdefault(flora_name, []).append({'ts': int(round(timestamp * 1000)), 'values': self.payload(data, timestamp, read_times, historic)})
+
+    def flush(self, force):
+        if not self.batch:
+            self.batch_start = None
+            return
+        self.batch_start = self.batch_start or time()
+        if force or len(self.batch) >= sum(1 for flora in self.flores.values() if self.owns(flora)) or time() - self.batch_start >= self.settings.batch_interval:
+            print_line('Publishing readings of {} sensors to MQTT topic "{}"'.format(len(self.batch), self.telemetry_topic))
+            self.mqtt.publish(self.telemetry_topic, json.dumps(self.batch), 1)
+            self.batch.clear()
+            self.batch_start = None
+
+    def deadline(self):
+        if self.batch_start is None:
+            return None
+        return self.batch_start + self.settings.batch_interval
+
+    def shutdown(self, flora_names, announce_offline):
+        if announce_offline:
+            for flora_name in flora_names:
+                self.mqtt.publish(self.disconnect_topic, json.dumps({'device': flora_name}), 1)
@@ -0,0 +1,51 @@
+from time import localtime, strftime
+
+from miflora_mqtt_daemon.console import print_line
+from miflora_mqtt_daemon.parameters import parameters
+from miflora_mqtt_daemon.reporters.base import Reporter
+
+# Control types and units of the Wiren Board conventions
+control_meta = [
+    ('battery', [('type', 'value'), ('units', '%')]),
+    ('conductivity', [('type', 'value'), ('units', 'µS/cm')]),
+    ('light', [('type', 'value'), ('units', 'lux')]),
+    ('moisture', [('type', 'rel_humidity')]),
+    ('temperature', [('type', 'temperature')]),
+    ('timestamp', [('type', 'text')]),
+]
+
+
+class WirenboardReporter(Reporter):
+    """One virtual device per sensor following the Wiren Board conventions, on the fixed topics /devices/<sensor>."""
+    default_base_topic = ''
+    per_value = True
+
+    def __init__(self, mqtt, settings):
+        super().__init__(mqtt, settings)
+        self.topics = dict()
+
+    def add(self, flora_name, flora):
+        super().add(flora_name, flora)
+        self.topics[flora_name] = {control: '/devices/{}/controls/{}'.format(flora_name, control) for control in list(parameters.keys()) + ['timestamp']}
+
+    def remove(self, flora_name, flora):
+        super().remove(flora_name, flora)
+        self.mqtt.publish('/devices/{}/meta/name'.format(flora_name), '', 1, True)
+        for topic in self.topics.pop(flora_name).values():
+            for suffix in ['', '/meta/type', '/meta/units']:
+                self.mqtt.publish('{}{}'.format(topic, suffix), '', 1, True)
+
+    def discover(self, flora_names):
+        for flora_name in flora_names:
+            topics = self.topics[flora_name]
+            self.mqtt.publish('/devices/{}/meta/name'.format(flora_name), flora_name, 1, True)
+            for [control, meta] in control_meta:
+                for [key, value] in meta:
+                    self.mqtt.publish('{}/meta/{}'.format(topics[control], key), value, 1, True)
+
+    def publish(self, flora_name, flora, data, timestamp, read_times, historic=False):
+        topics = self.topics[flora_name]
+        for [param, value] in data.items():
+            print_line('Publishing data to MQTT topic "{}"'.format(topics[param]))
+            self.mqtt.publish(topics[param], value, retain=True)
+        self.mqtt.publish(topics['timestamp'], strftime('%Y-%m-%d %H:%M:%S', localtime(timestamp)), retain=True)
@@ -0,0 +1,144 @@
+"""Background scan for advertisements, of the measurements in passive mode and of the signal strength per adapter."""
+
+import threading
+from abc import ABC, abstractmethod
+from time import sleep, time
+
+from miflora_mqtt_daemon.console import print_line
+from miflora_mqtt_daemon.mibeacon import decode_mibeacon
+
+
+class AdvertisementIndex:
+    """The latest advertised values and the sightings of the configured sensors, by MAC address.
+
+    advertisements: MAC address -> param -> (value, time received), for sensors read passively
+    sightings: MAC address -> adapter -> (smoothed RSSI, time last seen)
+    """
+
+    def __init__(self, max_age):
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.advertisements = dict()
+        self.sightings = dict()
+
+    def track(self, mac, passive):
+        with self.lock:
+            self.sightings.setdefault(mac.upper(), dict())
+            if passive:
+                self.advertisements.setdefault(mac.upper(), dict())
+
+    def forget(self, mac):
+        with self.lock:
+            self.sightings.pop(mac.upper(), None)
+            self.advertisements.pop(mac.upper(), None)
+
+    def macs(self):
+        with self.lock:
+            return list(self.sightings.keys())
+
+    def on_advertisement(self, mac, rssi, frame, adapter):
+        with self.lock:
+            if mac in self.sightings:
+                now = time()
+                last_rssi, last_seen = self.sightings[mac].get(adapter, (None, 0))
+                self.sightings[mac][adapter] = (rssi if now - last_seen > self.max_age else 0.7 * last_rssi + 0.3 * rssi, now)
+        try:
+            _, values = decode_mibeacon(frame)
+        except ValueError:
+            return
+        with self.lock:
+            if mac in self.advertisements:
+                now = time()
+                for [param, value] in values.items():
+                    self.advertisements[mac][param] = (value, now)
+
+    def received(self, mac):
+        with self.lock:
+            return dict(self.advertisements[mac.upper()])
+
+    def strongest_sighting(self, mac, adapters):
+        # Returns the adapter with the strongest signal of those that saw the sensor recently and its RSSI, or (None, None)
+        now = time()
+        with self.lock:
+            seen = [(rssi, adapter) for [adapter, (rssi, last_seen)] in self.sightings.get(mac.upper(), dict()).items() if adapter in adapters and now - last_seen < self.max_age]
+        if not seen:
+            return None, None
+        rssi, adapter = max(seen)
+        return adapter, rssi
+
+    def last_seen(self, mac, adapters):
+        # Returns when the sensor was last seen by any of the adapters, or None
+        with self.lock:
+            seen = [last_seen for [adapter, (rssi, last_seen)] in self.sightings.get(mac.upper(), dict()).items() if adapter in adapters]
+        return max(seen) if seen else None
+
+
+# Scanner backends, deliver the MAC address, RSSI, MiBeacon frame and adapter of every received advertisement
+class AdvertisementScanner(ABC):
+    def __init__(self, adapter, index, lock, jobs, passive):
+        self.adapter = adapter
+        self.index = index
+        self.callback = index.on_advertisement
+        # The adapter is shared with the poller, which takes precedence
+        self.lock = lock
+        self.jobs = jobs
+        self.passive = passive
+
+    def start(self):
+        threading.Thread(target=self.run, name='scanner-{}'.format(self.adapter), daemon=True).start()
+
+    @abstractmethod
+    def run(self):
+        pass
+
+class BluepyAdvertisementScanner(AdvertisementScanner):
+    # Longest pause between attempts after the scan failed
+    max_backoff = 300
+
+    def run(self):
+        from bluepy.btle import BTLEException, DefaultDelegate, Scanner
+
+        # Shorter windows while sensors are polled actively, the adapter cannot connect while it scans
+        scan_window = 10 if self.passive else 3
+        callback = self.callback
+        adapter = self.adapter
+        class Delegate(DefaultDelegate):
+            def handleDiscovery(self, device, is_new_device, is_new_data):
+                for (adtype, description, value) in device.getScanData():
+                    # 0x16 is "16b Service Data", bluepy returns it as hex string
+                    if adtype == 0x16 and value.startswith('95fe'):
+                        callback(device.addr.upper(), device.rssi, bytes.fromhex(value)[2:], adapter)
+
+        scanner = Scanner(int(self.adapter.replace('hci', ''))).withDelegate(Delegate())
+        failures = 0
+        while True:
+            # Scan in windows, GATT connections on the same adapter take precedence
+            if not self.jobs.empty():
+                sleep(1)
+                continue
+            error = None
+            with self.lock:
+                try:
+                    scanner.clear()
+                    scanner.start(passive=False)
+                    scanner.process(scan_window)
+                except BTLEException as e:
+                    error = e
+                finally:
+                    # The bluepy helper keeps running after a failed start, the next start would fail as well
+                    try:
+                        scanner.stop()
+                    except BTLEException:
+                        scanner._stopHelper()
+            if error is None:
+                if failures:
+                    print_line('Scanning on {} works again after {} failed attempts'.format(self.adapter, failures), sd_notify=True)
+                    failures = 0
+                # Let a waiting poll take the adapter
+                sleep(0.1)
+                continue
+            # E.g. missing capabilities, reported once and retried with exponential backoff
+            failures += 1
+            if failures == 1:
+                print_line('Scanning on {} failed due to exception: {}, retrying with backoff'.format(self.adapter, error), error=True, sd_notify=True)
+            sleep(min(2 ** failures, self.max_backoff))
@@ -0,0 +1,179 @@
+"""Simulated sensors for tests and benchmarks without bluetooth hardware, "backend = simulated".
+
+The values follow a daily cycle, differ between MAC addresses and are also served as hourly history and advertisements.
+They can be configured as fixed values or ranges, for all sensors or per MAC address.
+"""
+
+import math
+import random
+import struct
+import zlib
+from collections import OrderedDict
+from itertools import count
+from time import sleep, time
+
+from btlewrap import BluetoothBackendException
+from btlewrap.base import AbstractBackend
+from miflora.miflora_poller import MI_BATTERY, MI_CONDUCTIVITY, MI_LIGHT, MI_MOISTURE, MI_TEMPERATURE
+from miflora.miflora_poller import BYTEORDER, _HANDLE_DEVICE_TIME, _HANDLE_HISTORY_CONTROL, _HANDLE_HISTORY_READ, _CMD_HISTORY_READ_INIT
+from miflora.miflora_poller import _HANDLE_READ_NAME, _HANDLE_READ_SENSOR_DATA, _HANDLE_READ_VERSION_BATTERY
+
+from miflora_mqtt_daemon.mibeacon import mibeacon_objects
+from miflora_mqtt_daemon.scanning import AdvertisementScanner
+
+def simulated_rssi(mac, adapter):
+    # Stable per MAC address, adapter and simulated location (seed), with some noise
+    return -45 - zlib.crc32('{}/{}/{}'.format(mac.upper(), adapter, SimulatedBackend.seed).encode()) % 45 + random.randint(-2, 2)
+
+# Configured values, a fixed value or a range "min:max"
+simulated_params = [MI_LIGHT, MI_TEMPERATURE, MI_MOISTURE, MI_CONDUCTIVITY, MI_BATTERY]
+def parse_simulated_value(param, value):
+    try:
+        low, _, high = value.partition(':')
+        low = float(low)
+        high = float(high) if high else low
+        if high < low:
+            raise ValueError
+    except ValueError:
+        raise ValueError('The simulated {} "{}" is neither a number nor a range "min:max". Please check your configuration'.format(param, value))
+    return low, high
+
+def parse_simulated_sensors(definitions):
+    # One sensor per line, e.g. "C4:7C:8D:11:22:33 moisture=10 battery=5:10"
+    sensor_values = dict()
+    for definition in definitions.splitlines():
+        if not definition.strip():
+            continue
+        mac, *options = definition.split()
+        values = sensor_values.setdefault(mac.upper(), dict())
+        for option in options:
+            param, _, value = option.partition('=')
+            if param not in simulated_params:
+                raise ValueError('Unknown simulated value "{}" of sensor {}. Please check your configuration'.format(option, mac))
+            values[param] = parse_simulated_value(param, value)
+    return sensor_values
+
+def simulated_values(mac, timestamp):
+    seed = int(mac.replace(':', ''), 16)
+    daylight = max(0.0, math.sin(2 * math.pi * ((timestamp + seed) % 86400) / 86400))
+    values = OrderedDict()
+    values[MI_LIGHT] = int(daylight * (1000 + seed % 30000))
+    values[MI_TEMPERATURE] = round(15 + seed % 10 + 8 * daylight, 1)
+    values[MI_MOISTURE] = 20 + seed % 50
+    values[MI_CONDUCTIVITY] = 200 + seed % 1500
+    values[MI_BATTERY] = 100 - seed % 60
+    # Within a configured range, light and temperature follow the daily cycle, the others differ between MAC addresses
+    configured = dict(SimulatedBackend.values, **SimulatedBackend.sensor_values.get(mac.upper(), dict()))
+    for [param, (low, high)] in configured.items():
+        if param in [MI_LIGHT, MI_TEMPERATURE]:
+            value = low + daylight * (high - low)
+        else:
+            value = low + seed % (int(high - low) + 1)
+        values[param] = round(value, 1) if param == MI_TEMPERATURE else int(value)
+    return values
+
+class SimulatedBackend(AbstractBackend):
+    latency = 0.5
+    failure_rate = 0.0
+    firmware = '3.2.1'
+    boot_time = time() - 604800
+    out_of_range = []
+    seed = '0'
+    advertisement_interval = 5
+    values = dict()
+    sensor_values = dict()
+
+    @classmethod
+    def configure(cls, simulation):
+        cls.latency = simulation.getfloat('latency', 0.5)
+        cls.failure_rate = simulation.getfloat('failure_rate', 0.0)
+        cls.firmware = simulation.get('firmware', '3.2.1')
+        cls.boot_time = time() - simulation.getint('uptime', 604800)
+        cls.out_of_range = [mac.strip().upper() for mac in simulation.get('out_of_range', '').split(',') if mac.strip()]
+        cls.seed = simulation.get('seed', '0')
+        cls.advertisement_interval = simulation.getint('advertisement_interval', 5)
+        cls.values = {param: parse_simulated_value(param, simulation[param]) for param in simulated_params if simulation.get(param)}
+        cls.sensor_values = parse_simulated_sensors(simulation.get('sensors', ''))
+
+    def __init__(self, adapter='hci0', address_type='public', **kwargs):
+        super().__init__(adapter, address_type, **kwargs)
+        self._mac = None
+        self._history_command = b''
+
+    def connect(self, mac):
+        sleep(self.latency * random.uniform(0.5, 1.5))
+        if random.random() < self.failure_rate or mac.upper() in self.out_of_range:
+            raise BluetoothBackendException('Simulated connection failure to {}'.format(mac))
+        self._mac = mac
+
+    def disconnect(self):
+        self._mac = None
+
+    def write_handle(self, handle, value):
+        if self._mac is None:
+            raise BluetoothBackendException('Not connected')
+        if handle == _HANDLE_HISTORY_CONTROL:
+            self._history_command = value
+        return True
+
+    def read_handle(self, handle):
+        if self._mac is None:
+            raise BluetoothBackendException('Not connected')
+        now = time()
+        device_time = int(now - self.boot_time)
+        values = simulated_values(self._mac, now)
+        if handle == _HANDLE_READ_NAME:
+            return b'Flower care'
+        if handle == _HANDLE_READ_VERSION_BATTERY:
+            return bytes([values[MI_BATTERY], 0x2b]) + self.firmware.encode()
+        if handle == _HANDLE_READ_SENSOR_DATA:
+            return struct.pack('<hxIBH6s', int(values[MI_TEMPERATURE] * 10), values[MI_LIGHT], values[MI_MOISTURE], values[MI_CONDUCTIVITY], b'\x02\x3c\x00\xfb\x34\x9b')
+        if handle == _HANDLE_DEVICE_TIME:
+            return device_time.to_bytes(4, BYTEORDER)
+        if handle == _HANDLE_HISTORY_READ:
+            # Hourly records, the newest first
+            history_length = min(device_time // 3600, 4000)
+            if self._history_command == _CMD_HISTORY_READ_INIT:
+                return history_length.to_bytes(2, BYTEORDER) + bytes(14)
+            index = int.from_bytes(self._history_command[1:3], BYTEORDER)
+            if index >= history_length:
+                raise BluetoothBackendException('History index out of range')
+            record_time = (device_time // 3600 - index) * 3600
+            values = simulated_values(self._mac, now - device_time + record_time)
+            return (record_time.to_bytes(4, BYTEORDER) + int(values[MI_TEMPERATURE] * 10).to_bytes(2, BYTEORDER, signed=True) + b'\x00' +
+                    values[MI_LIGHT].to_bytes(3, BYTEORDER) + b'\x00' + bytes([values[MI_MOISTURE]]) +
+                    values[MI_CONDUCTIVITY].to_bytes(2, BYTEORDER) + b'\x00\x00')
+        raise BluetoothBackendException('Simulated sensor has no handle 0x{:02x}'.format(handle))
+
+    @staticmethod
+    def check_backend():
+        return True
+
+    @staticmethod
+    def scan_for_devices(timeout, adapter='hci0'):
+        return []
+
+class SimulatedAdvertisementScanner(AdvertisementScanner):
+    encoders = {
+        0x1004: lambda value: int(value * 10).to_bytes(2, 'little', signed=True),
+        0x1007: lambda value: value.to_bytes(3, 'little'),
+        0x1008: lambda value: bytes([value]),
+        0x1009: lambda value: value.to_bytes(2, 'little'),
+        0x100a: lambda value: bytes([value]),
+    }
+
+    def run(self):
+        frame_counter = count()
+        while True:
+            for mac in self.index.macs():
+                if mac in SimulatedBackend.out_of_range:
+                    continue
+                values = simulated_values(mac, time())
+                for [object_type, (param, _)] in mibeacon_objects.items():
+                    value = self.encoders[object_type](values[param])
+                    # Frame control: MAC address and object included, product id of the Mi Flora
+                    frame = struct.pack('<HHB', 0x0050, 0x0098, next(frame_counter) % 256)
+                    frame += bytes(reversed(bytes.fromhex(mac.replace(':', ''))))
+                    frame += struct.pack('<HB', object_type, len(value)) + value
+                    self.callback(mac, simulated_rssi(mac, self.adapter), frame, self.adapter)
+            sleep(SimulatedBackend.advertisement_interval)
@@ -0,0 +1,65 @@
+"""Fleet snapshot, the readings of all sensors in one message per pass, one column per field and one row per reading."""
+
+import json
+from collections import OrderedDict
+from time import time
+
+from miflora_mqtt_daemon.console import print_line
+from miflora_mqtt_daemon.parameters import parameters
+
+def snapshot_encoder(snapshot_format):
+    # The binary formats need an optional package, raises ValueError if it is missing
+    if snapshot_format == 'cbor':
+        try:
+            import cbor2
+        except ImportError:
+            raise ValueError('Parameter "snapshot = cbor" requires the Python package cbor2')
+        return cbor2.dumps
+    if snapshot_format == 'msgpack':
+        try:
+            import msgpack
+        except ImportError:
+            raise ValueError('Parameter "snapshot = msgpack" requires the Python package msgpack')
+        return lambda snapshot: msgpack.packb(snapshot, use_bin_type=True)
+    return json.dumps
+
+
+class Snapshot:
+    """Collects the readings of a pass, published once all sensors have reported or the batch interval is over."""
+    columns = ['sensor', 'mac', 'time'] + list(parameters.keys())
+
+    def __init__(self, mqtt, settings, flores, encode):
+        self.mqtt = mqtt
+        self.topic = settings.snapshot_topic
+        self.batch_interval = settings.batch_interval
+        self.encode = encode
+        self.flores = flores
+        # Whether this node polls a sensor, replaced by the daemon in cluster mode
+        self.owns = lambda flora: True
+        self.rows = []
+        self.sensors = set()
+        self.start = None
+
+    def add(self, flora_name, flora, data, timestamp):
+        self.rows.append([flora_name, flora['mac'], round(timestamp, 3)] + [data.get(param) for param in parameters.keys()])
+        self.sensors.add(flora_name)
+        self.start = self.start or time()
+
+    def flush(self, force):
+        if not self.rows:
+            self.start = None
+            return
+        if force or len(self.sensors) >= sum(1 for flora in self.flores.values() if self.owns(flora)) or time() - self.start >= self.batch_interval:
+            snapshot = OrderedDict([('timestamp', round(time(), 3)), ('count', len(self.rows))])
+            for [index, column] in enumerate(self.columns):
+                snapshot[column] = [row[index] for row in self.rows]
+            print_line('Publishing snapshot of {} sensors to MQTT topic "{}"'.format(len(self.sensors), self.topic))
+            self.mqtt.publish(self.topic, self.encode(snapshot), 1)
+            self.rows.clear()
+            self.sensors.clear()
+            self.start = None
+
+    def deadline(self):
+        if self.start is None:
+            return None
+        return self.start + self.batch_interval
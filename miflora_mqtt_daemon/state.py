@@ -0,0 +1,26 @@
+"""Persistent daemon state per MAC address, kept in a JSON file next to config.ini:
+the device metadata, the time of the last successful read and the last synced history record."""
+
+import json
+import os
+
+from miflora_mqtt_daemon.console import print_line
+
+def load_state(path):
+    try:
+        with open(path) as state_file:
+            return json.load(state_file)
+    except FileNotFoundError:
+        return dict()
+    except (IOError, ValueError) as e:
+        print_line('State file "{}" could not be read, starting over: {}'.format(os.path.basename(path), e), warning=True, sd_notify=True)
+        return dict()
+
+def save_state(path, device_state):
+    # Write to a temporary file first, a crash must never leave a truncated state file behind
+    try:
+        with open(path + '.tmp', 'w') as state_file:
+            json.dump(device_state, state_file, indent=2, sort_keys=True)
+        os.replace(path + '.tmp', path)
+    except IOError as e:
+        print_line('State file "{}" could not be written: {}'.format(os.path.basename(path), e), error=True)
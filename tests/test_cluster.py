@@ -0,0 +1,55 @@
+import unittest
+from collections import OrderedDict
+from types import SimpleNamespace
+
+from miflora_mqtt_daemon.cluster import Cluster
+
+MACS = ['C4:7C:8D:00:00:01', 'C4:7C:8D:00:00:02', 'C4:7C:8D:00:00:03', 'C4:7C:8D:00:00:04']
+
+
+def node(rssi, owned=(), adapters=1):
+    return {'adapters': adapters, 'owned': list(owned), 'rssi': rssi}
+
+
+class ElectTest(unittest.TestCase):
+    def setUp(self):
+        settings = SimpleNamespace(cluster_node_id='a', cluster_topic='miflora/$cluster', cluster_heartbeat=30,
+                                   cluster_load_penalty=10.0, cluster_hysteresis=5.0, used_adapters=['hci0'], mqtt_inflight=20)
+        flores = OrderedDict(('flora{}'.format(index), {'mac': mac.lower()}) for [index, mac] in enumerate(MACS))
+        self.cluster = Cluster(settings, None, flores, None, ['hci0'], None)
+
+    def test_strongest_signal_wins(self):
+        owners = self.cluster.elect({
+            'a': node({MACS[0]: -50, MACS[1]: -90, MACS[2]: -60, MACS[3]: -85}),
+            'b': node({MACS[0]: -90, MACS[1]: -50, MACS[2]: -85, MACS[3]: -60}),
+        })
+        self.assertEqual(owners, {MACS[0]: 'a', MACS[1]: 'b', MACS[2]: 'a', MACS[3]: 'b'})
+
+    def test_sensors_out_of_range_are_left_to_others(self):
+        owners = self.cluster.elect({'a': node({MACS[0]: -50}), 'b': node({mac: -95 for mac in MACS})})
+        self.assertEqual([owners[mac] for mac in MACS], ['a', 'b', 'b', 'b'])
+
+    def test_load_is_shared(self):
+        # With the same signal everywhere the load penalty spreads the sensors evenly
+        owners = self.cluster.elect({'a': node({mac: -70 for mac in MACS}), 'b': node({mac: -70 for mac in MACS})})
+        self.assertEqual(sorted(owners.values()), ['a', 'a', 'b', 'b'])
+
+    def test_load_follows_adapters(self):
+        owners = self.cluster.elect({'a': node({mac: -70 for mac in MACS}, adapters=3), 'b': node({mac: -70 for mac in MACS})})
+        self.assertEqual(sorted(owners.values()), ['a', 'a', 'a', 'b'])
+
+    def test_hysteresis_keeps_owner(self):
+        nodes = {'a': node({MACS[0]: -70}), 'b': node({MACS[0]: -67}, owned=[MACS[0]])}
+        self.assertEqual(self.cluster.elect(nodes)[MACS[0]], 'b')
+        nodes['a']['rssi'][MACS[0]] = -60
+        self.assertEqual(self.cluster.elect(nodes)[MACS[0]], 'a')
+
+    def test_same_result_on_every_node(self):
+        nodes = {'a': node({mac: -70 for mac in MACS}), 'b': node({mac: -70 for mac in MACS}), 'c': node({MACS[2]: -40})}
+        reversed_nodes = dict(reversed(list(nodes.items())))
+        self.assertEqual(self.cluster.elect(nodes), self.cluster.elect(reversed_nodes))
+        self.assertEqual(self.cluster.elect(nodes)[MACS[2]], 'c')
+
+
+if __name__ == '__main__':
+    unittest.main()
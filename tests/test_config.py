@@ -0,0 +1,58 @@
+import unittest
+
+from miflora_mqtt_daemon.config import parse_flora, parse_sensor_definition
+
+
+class ParseSensorDefinitionTest(unittest.TestCase):
+    def test_mac_only(self):
+        self.assertEqual(parse_sensor_definition('C4:7C:8D:11:22:33'), ('C4:7C:8D:11:22:33', {}))
+
+    def test_options(self):
+        self.assertEqual(parse_sensor_definition('  C4:7C:8D:11:22:33 adapter=hci1 '), ('C4:7C:8D:11:22:33', {'adapter': 'hci1'}))
+
+    def test_comma_separated_options(self):
+        self.assertEqual(parse_sensor_definition('C4:7C:8D:11:22:33, adapter=hci1'), ('C4:7C:8D:11:22:33', {'adapter': 'hci1'}))
+
+    def test_period(self):
+        self.assertEqual(parse_sensor_definition('C4:7C:8D:11:22:33 adapter=hci1 period=60'),
+                         ('C4:7C:8D:11:22:33', {'adapter': 'hci1', 'period': '60'}))
+
+    def test_unknown_option(self):
+        with self.assertRaisesRegex(ValueError, 'Unknown sensor option "interval=60"'):
+            parse_sensor_definition('C4:7C:8D:11:22:33 interval=60')
+
+    def test_option_without_value(self):
+        for definition in ['C4:7C:8D:11:22:33 adapter=', 'C4:7C:8D:11:22:33 adapter']:
+            with self.subTest(definition=definition), self.assertRaises(ValueError):
+                parse_sensor_definition(definition)
+
+
+class ParseFloraTest(unittest.TestCase):
+    def test_round_robin_adapters(self):
+        adapters = [parse_flora(index, 'Sensor', 'C4:7C:8D:11:22:33', 300, ['hci0', 'hci1'])['adapter'] for index in range(3)]
+        self.assertEqual(adapters, ['hci0', 'hci1', 'hci0'])
+
+    def test_pinned_adapter(self):
+        flora = parse_flora(0, 'Sensor', 'C4:7C:8D:11:22:33 adapter=hci1', 300, ['hci0', 'hci1'])
+        self.assertEqual((flora['adapter'], flora['pinned']), ('hci1', 'hci1'))
+
+    def test_unused_adapter(self):
+        with self.assertRaisesRegex(ValueError, 'The adapter "hci2" of sensor "Sensor" is not listed'):
+            parse_flora(0, 'Sensor', 'C4:7C:8D:11:22:33 adapter=hci2', 300, ['hci0', 'hci1'])
+
+    def test_period(self):
+        self.assertEqual(parse_flora(0, 'Sensor', 'C4:7C:8D:11:22:33', 300, ['hci0'])['period'], 300)
+        self.assertEqual(parse_flora(0, 'Sensor', 'C4:7C:8D:11:22:33 period=60', 300, ['hci0'])['period'], 60)
+
+    def test_invalid_period(self):
+        for definition in ['C4:7C:8D:11:22:33 period=0', 'C4:7C:8D:11:22:33 period=often']:
+            with self.subTest(definition=definition), self.assertRaisesRegex(ValueError, 'is not a positive number of seconds'):
+                parse_flora(0, 'Sensor', definition, 300, ['hci0'])
+
+    def test_invalid_default_period(self):
+        with self.assertRaisesRegex(ValueError, 'The period "0" of sensor "Sensor"'):
+            parse_flora(0, 'Sensor', 'C4:7C:8D:11:22:33', 0, ['hci0'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,208 @@
+import os
+import tempfile
+import unittest
+from collections import OrderedDict
+from types import SimpleNamespace
+
+from miflora.miflora_poller import MI_CONDUCTIVITY, MI_LIGHT, MI_MOISTURE, MI_TEMPERATURE
+
+from miflora_mqtt_daemon.config import config_values, parse_sensors, read_config
+from miflora_mqtt_daemon.daemon import Daemon
+from miflora_mqtt_daemon.scanning import AdvertisementIndex
+
+
+DEADBANDS = {MI_TEMPERATURE: (0.5, False), MI_MOISTURE: (0, False), MI_LIGHT: (10.0, True), MI_CONDUCTIVITY: (5.0, True)}
+
+
+def daemon(per_value=False, deadbands=DEADBANDS, flores=None):
+    # The methods under test only need these attributes, the constructor would connect to the broker and the adapters
+    instance = Daemon.__new__(Daemon)
+    instance.settings = SimpleNamespace(heartbeat=3600)
+    instance.reporter = SimpleNamespace(per_value=per_value)
+    instance.set_deadbands(deadbands)
+    instance.flores = flores or OrderedDict()
+    instance.schedule_anchors = dict()
+    return instance
+
+
+def reading(temperature=20.0, moisture=40, light=1000, conductivity=500):
+    return OrderedDict([(MI_TEMPERATURE, temperature), (MI_MOISTURE, moisture), (MI_LIGHT, light), (MI_CONDUCTIVITY, conductivity)])
+
+
+class SignificantChangesTest(unittest.TestCase):
+    def setUp(self):
+        self.flora = {'published': dict(), 'published_time': 0}
+
+    def test_without_deadband(self):
+        instance = daemon(per_value=True, deadbands={MI_TEMPERATURE: (0.5, False)})
+        instance.significant_changes(self.flora, reading(), 10000)
+        self.assertEqual(instance.significant_changes(self.flora, reading(), 10060),
+                         OrderedDict([(MI_MOISTURE, 40), (MI_LIGHT, 1000), (MI_CONDUCTIVITY, 500)]))
+
+    def test_disabled(self):
+        data = reading()
+        instance = daemon(deadbands=dict())
+        self.assertIs(instance.significant_changes(self.flora, data, 10000), data)
+        self.assertIsNone(instance.reporter.heartbeat)
+
+    def test_heartbeat_passed_to_reporter(self):
+        self.assertEqual(daemon().reporter.heartbeat, 3600)
+
+    def test_first_reading_is_published(self):
+        self.assertEqual(daemon().significant_changes(self.flora, reading(), 10000), reading())
+
+    def test_within_deadbands(self):
+        instance = daemon(per_value=True)
+        instance.significant_changes(self.flora, reading(), 10000)
+        # Absolute deadband of 0.5 °C, relative deadband of 10 % of the last published light
+        self.assertIsNone(instance.significant_changes(self.flora, reading(temperature=20.5, light=1100), 10060))
+
+    def test_per_value_publishes_changed_values(self):
+        instance = daemon(per_value=True)
+        instance.significant_changes(self.flora, reading(), 10000)
+        self.assertEqual(instance.significant_changes(self.flora, reading(temperature=20.6, light=1100, moisture=41), 10060),
+                         OrderedDict([(MI_TEMPERATURE, 20.6), (MI_MOISTURE, 41)]))
+        # The deadband counts from the last published value, not from the last reading
+        self.assertEqual(instance.significant_changes(self.flora, reading(temperature=21.0, light=1101, moisture=41), 10120),
+                         OrderedDict([(MI_LIGHT, 1101)]))
+
+    def test_whole_reading_on_change(self):
+        instance = daemon()
+        instance.significant_changes(self.flora, reading(), 10000)
+        self.assertEqual(instance.significant_changes(self.flora, reading(light=1200), 10060), reading(light=1200))
+
+    def test_heartbeat(self):
+        instance = daemon(per_value=True)
+        instance.significant_changes(self.flora, reading(), 10000)
+        self.assertIsNone(instance.significant_changes(self.flora, reading(temperature=20.1), 13599))
+        self.assertEqual(instance.significant_changes(self.flora, reading(temperature=20.1), 13600), reading(temperature=20.1))
+
+
+class NextSlotTest(unittest.TestCase):
+    def setUp(self):
+        self.daemon = daemon(flores=OrderedDict([('Alpha', {'refresh': 300})]))
+        self.daemon.schedule_anchors['Alpha'] = 1000
+
+    def test_next_slot(self):
+        self.assertEqual(self.daemon.next_slot('Alpha', 1000), 1300)
+        self.assertEqual(self.daemon.next_slot('Alpha', 1299.9), 1300)
+        self.assertEqual(self.daemon.next_slot('Alpha', 1300), 1600)
+
+    def test_missed_slots_are_skipped(self):
+        self.assertEqual(self.daemon.next_slot('Alpha', 2250), 2500)
+
+    def test_before_anchor(self):
+        self.assertEqual(self.daemon.next_slot('Alpha', 850), 1000)
+
+
+CONFIG = """
+[General]
+adapter = hci0,hci1
+[Daemon]
+period = 300
+heartbeat = 3600
+[MQTT]
+[Sensors]
+Alpha@Garden = C4:7C:8D:00:00:01
+Beta = C4:7C:8D:00:00:02
+Gamma = C4:7C:8D:00:00:03
+"""
+
+
+class Reporter:
+    def __init__(self):
+        self.calls = []
+
+    def add(self, flora_name, flora):
+        self.calls.append(('add', flora_name))
+
+    def remove(self, flora_name, flora):
+        self.calls.append(('remove', flora_name))
+
+    def discover(self, flora_names):
+        self.calls.append(('discover', flora_names))
+
+    def deadbands_changed(self):
+        return ['Alpha']
+
+
+class ReloadConfigTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.daemon = self.reloaded(CONFIG, startup=True)
+        self.daemon.reporter.calls = []
+
+    def write_config(self, text):
+        with open(os.path.join(self.directory.name, 'config.ini'), 'w') as config_file:
+            config_file.write(text)
+
+    def reloaded(self, text, startup=False):
+        self.write_config(text)
+        if not startup:
+            self.daemon.reload_config()
+            return self.daemon
+        config = read_config(self.directory.name)
+        instance = daemon()
+        instance.settings = SimpleNamespace(config_dir=self.directory.name, used_adapters=['hci0', 'hci1'], reading_source='active', heartbeat=3600)
+        instance.reporter = Reporter()
+        instance.set_deadbands(dict())
+        instance.loaded_config_values = config_values(config)
+        instance.index = AdvertisementIndex(300)
+        instance.scanning = False
+        instance.cluster = None
+        instance.schedule = []
+        # Without connecting to the adapters, the reload only touches these fields of a sensor
+        instance.create_flora = lambda sensor: {'mac': sensor['mac'], 'refresh': sensor['period'], 'pinned': sensor['pinned'], 'poller': SimpleNamespace(),
+                                                'name_pretty': sensor['name_pretty'], 'location_clean': sensor['location_clean'], 'location_pretty': sensor['location_pretty']}
+        for [flora_name, sensor] in parse_sensors(config, ['hci0', 'hci1']).items():
+            instance.flores[flora_name] = instance.create_flora(sensor)
+            instance.schedule_anchors[flora_name] = 1000
+            instance.schedule.append((1000, flora_name))
+        return instance
+
+    def test_unchanged(self):
+        self.reloaded(CONFIG)
+        self.assertEqual(list(self.daemon.flores.keys()), ['Alpha', 'Beta', 'Gamma'])
+        self.assertEqual(self.daemon.reporter.calls, [])
+
+    def test_added_and_removed(self):
+        self.reloaded(CONFIG.replace('Beta = C4:7C:8D:00:00:02', 'Delta = C4:7C:8D:00:00:04'))
+        self.assertEqual(sorted(self.daemon.flores.keys()), ['Alpha', 'Delta', 'Gamma'])
+        self.assertEqual(self.daemon.reporter.calls, [('remove', 'Beta'), ('add', 'Delta'), ('discover', ['Delta'])])
+        self.assertEqual(sorted(flora_name for [_, flora_name] in self.daemon.schedule), ['Alpha', 'Delta', 'Gamma'])
+
+    def test_new_mac_replaces_sensor(self):
+        self.reloaded(CONFIG.replace('Beta = C4:7C:8D:00:00:02', 'Beta = C4:7C:8D:00:00:05'))
+        self.assertEqual(self.daemon.flores['Beta']['mac'], 'C4:7C:8D:00:00:05')
+        self.assertEqual(self.daemon.reporter.calls, [('remove', 'Beta'), ('add', 'Beta'), ('discover', ['Beta'])])
+
+    def test_changed_period_and_name(self):
+        self.reloaded(CONFIG.replace('Alpha@Garden = C4:7C:8D:00:00:01', 'Alpha@Kitchen = C4:7C:8D:00:00:01 period=600'))
+        alpha = self.daemon.flores['Alpha']
+        self.assertEqual((alpha['refresh'], alpha['location_pretty']), (600, 'Kitchen'))
+        self.assertEqual(alpha['poller']._cache_timeout.total_seconds(), 599)
+        # The sensor moves to the next slot of its new cadence
+        [due] = [due for [due, flora_name] in self.daemon.schedule if flora_name == 'Alpha']
+        self.assertEqual((due - 1000) % 600, 0)
+        self.assertEqual(self.daemon.reporter.calls, [('discover', ['Alpha'])])
+
+    def test_deadbands(self):
+        self.reloaded(CONFIG + '[Deadbands]\ntemperature = 0.5\n')
+        self.assertEqual(self.daemon.deadbands, {'temperature': (0.5, False)})
+        self.assertEqual(self.daemon.reporter.heartbeat, 3600)
+        self.assertEqual(self.daemon.reporter.calls, [('discover', ['Alpha'])])
+
+    def test_other_changes_need_restart(self):
+        self.reloaded(CONFIG.replace('heartbeat = 3600', 'heartbeat = 60'))
+        self.assertEqual(self.daemon.loaded_config_values[('Daemon', 'heartbeat')], '3600')
+        self.assertEqual(self.daemon.reporter.calls, [])
+
+    def test_invalid_configuration_is_not_applied(self):
+        self.reloaded(CONFIG.replace('Beta = C4:7C:8D:00:00:02', 'Beta = C4:7C:8D:00:00:02 period=-1'))
+        self.assertEqual(self.daemon.flores['Beta']['refresh'], 300)
+        self.assertEqual(self.daemon.reporter.calls, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
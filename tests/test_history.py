@@ -0,0 +1,84 @@
+import unittest
+from collections import OrderedDict
+from time import time
+from types import SimpleNamespace
+
+from miflora.miflora_poller import MI_BATTERY, MI_CONDUCTIVITY, MI_LIGHT, MI_MOISTURE, MI_TEMPERATURE, MiFloraPoller
+
+from miflora_mqtt_daemon.bluetooth import AdapterBluetoothInterface, bluetooth_errors
+from miflora_mqtt_daemon.metrics import Metrics
+from miflora_mqtt_daemon.polling import FloraReader
+from miflora_mqtt_daemon.simulation import SimulatedBackend, simulated_values
+
+MAC = 'C4:7C:8D:00:00:01'
+
+
+class OldestFirstBackend(SimulatedBackend):
+    # Some firmware versions keep the log the other way round
+    def write_handle(self, handle, value):
+        if len(value) == 3 and value[0] == 0xa1:
+            history_length = int((time() - self.boot_time) // 3600)
+            index = history_length - 1 - int.from_bytes(value[1:3], 'little')
+            value = value[0:1] + index.to_bytes(2, 'little')
+        return super().write_handle(handle, value)
+
+
+class SyncHistoryTest(unittest.TestCase):
+    def setUp(self):
+        defaults = {name: getattr(SimulatedBackend, name) for name in ['latency', 'failure_rate', 'boot_time']}
+        self.addCleanup(lambda: [setattr(SimulatedBackend, name, value) for [name, value] in defaults.items()])
+        SimulatedBackend.latency = 0
+        SimulatedBackend.failure_rate = 0.0
+        # The sensor has been running for 10 hours, its log holds 10 hourly records
+        SimulatedBackend.boot_time = time() - 10 * 3600 - 1800
+        settings = SimpleNamespace(slow_field_periods=OrderedDict([(MI_BATTERY, 86400), ('firmware', 86400)]), history_backfill=4)
+        self.reader = FloraReader(settings, bluetooth_errors('simulated'), None, dict())
+        poller = MiFloraPoller(mac=MAC, backend=SimulatedBackend, cache_timeout=60)
+        poller._bt_interface = AdapterBluetoothInterface(SimulatedBackend, 'Alpha', Metrics(0, '127.0.0.1'))
+        self.flora = {'name_pretty': 'Alpha', 'mac': MAC, 'adapter': 'hci0', 'poller': poller, 'tiers': dict(), 'firmware': '0.0.0', 'device_name': None}
+
+    def test_backfill(self):
+        readings, position = self.reader.sync_history(self.flora, None)
+        # Records of the last 4 hours, oldest first, on the wall clock
+        self.assertEqual(len(readings), 4)
+        timestamps = [timestamp for [timestamp, _] in readings]
+        self.assertEqual(timestamps, sorted(timestamps))
+        self.assertAlmostEqual(timestamps[-1], SimulatedBackend.boot_time + position, delta=2)
+        self.assertEqual(position, 10 * 3600)
+        for [timestamp, data] in readings:
+            expected = simulated_values(MAC, timestamp)
+            self.assertEqual({param: data[param] for param in [MI_TEMPERATURE, MI_LIGHT, MI_MOISTURE, MI_CONDUCTIVITY]},
+                             {param: expected[param] for param in [MI_TEMPERATURE, MI_LIGHT, MI_MOISTURE, MI_CONDUCTIVITY]})
+        # The log has no battery level, only the newest record gets the current one
+        self.assertEqual([MI_BATTERY in data for [_, data] in readings], [False] * 3 + [True])
+
+    def test_oldest_first_log(self):
+        newest_first, _ = self.reader.sync_history(self.flora, None)
+        self.flora['poller']._bt_interface = AdapterBluetoothInterface(OldestFirstBackend, 'Alpha', Metrics(0, '127.0.0.1'))
+        oldest_first, position = self.reader.sync_history(self.flora, None)
+        self.assertEqual(position, 10 * 3600)
+        self.assertEqual([data for [_, data] in oldest_first], [data for [_, data] in newest_first])
+
+    def test_only_new_records(self):
+        _, position = self.reader.sync_history(self.flora, None)
+        self.assertEqual(self.reader.sync_history(self.flora, position), ([], position))
+        # Two hours later
+        SimulatedBackend.boot_time -= 2 * 3600
+        readings, new_position = self.reader.sync_history(self.flora, position)
+        self.assertEqual(len(readings), 2)
+        self.assertEqual(new_position, position + 2 * 3600)
+
+    def test_clock_reset(self):
+        # A new battery restarts the clock of the sensor and its log, the last synced position lies in the future
+        SimulatedBackend.boot_time = time() - 2 * 3600 - 1800
+        readings, position = self.reader.sync_history(self.flora, 10 * 3600)
+        self.assertEqual(len(readings), 2)
+        self.assertEqual(position, 2 * 3600)
+
+    def test_failed_connection(self):
+        SimulatedBackend.failure_rate = 1.0
+        self.assertEqual(self.reader.sync_history(self.flora, None), (None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import os
+import tempfile
+import unittest
+from collections import OrderedDict
+from time import time
+from types import SimpleNamespace
+
+from miflora_mqtt_daemon.daemon import Daemon
+from miflora_mqtt_daemon.journal import Journal
+
+
+def journal(directory, max_age=604800, max_entries=100000, sync_interval=30):
+    settings = SimpleNamespace(journal_max_age=max_age, journal_max_entries=max_entries, journal_sync_interval=sync_interval)
+    return Journal(os.path.join(directory, 'journal.db'), settings)
+
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_readings_in_order(self):
+        instance = journal(self.directory.name)
+        now = time()
+        instance.append('Alpha', now - 2, OrderedDict([('temperature', 20.5), ('moisture', 40)]), {'battery': now - 100})
+        instance.append('Beta', now - 1, OrderedDict([('temperature', 21.0)]), {})
+        rows = instance.oldest()
+        self.assertEqual([(flora_name, timestamp, data, read_times) for [_, flora_name, timestamp, data, read_times] in rows], [
+            ('Alpha', now - 2, OrderedDict([('temperature', 20.5), ('moisture', 40)]), {'battery': now - 100}),
+            ('Beta', now - 1, OrderedDict([('temperature', 21.0)]), {}),
+        ])
+        # The key order of the readings is kept
+        self.assertEqual(list(rows[0][3].keys()), ['temperature', 'moisture'])
+
+    def test_chunks_and_delete(self):
+        instance = journal(self.directory.name)
+        for index in range(Journal.replay_chunk + 5):
+            instance.append('Alpha', time(), {'moisture': index}, {})
+        rows = instance.oldest()
+        self.assertEqual(len(rows), Journal.replay_chunk)
+        instance.delete(rows[-1][0])
+        self.assertEqual([data['moisture'] for [_, _, _, data, _] in instance.oldest()], list(range(Journal.replay_chunk, Journal.replay_chunk + 5)))
+
+    def test_kept_across_restarts(self):
+        instance = journal(self.directory.name)
+        instance.append('Alpha', time(), {'moisture': 40}, {})
+        instance.close()
+        self.assertEqual(len(journal(self.directory.name).oldest()), 1)
+
+    def test_prune_by_age(self):
+        instance = journal(self.directory.name, max_age=3600)
+        instance.append('Alpha', time() - 7200, {'moisture': 40}, {})
+        instance.append('Alpha', time() - 60, {'moisture': 41}, {})
+        self.assertEqual([data['moisture'] for [_, _, _, data, _] in instance.oldest()], [41])
+
+    def test_prune_by_entries(self):
+        instance = journal(self.directory.name, max_entries=3)
+        for index in range(5):
+            instance.append('Alpha', time(), {'moisture': index}, {})
+        self.assertEqual([data['moisture'] for [_, _, _, data, _] in instance.oldest()], [2, 3, 4])
+
+    def test_commits_are_batched(self):
+        instance = journal(self.directory.name, sync_interval=30)
+        instance.append('Alpha', time(), {'moisture': 40}, {})
+        self.assertEqual(instance.uncommitted, 1)
+        self.assertEqual(instance.deadline(), instance.last_commit + 30)
+        instance.commit(force=True)
+        self.assertEqual(instance.uncommitted, 0)
+        self.assertIsNone(instance.deadline())
+
+
+class Connection:
+    def __init__(self, acknowledged):
+        self.min_qos = 0
+        self.acknowledged = acknowledged
+
+    def wait_for_publish(self, timeout):
+        return self.acknowledged
+
+
+class Reporter:
+    def __init__(self, connection):
+        self.connection = connection
+        self.published = []
+
+    def publish(self, flora_name, flora, data, timestamp, read_times, historic=False):
+        self.published.append((flora_name, data, historic, self.connection.min_qos))
+
+    def flush(self, force):
+        pass
+
+
+class JournalReplayTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.journal = journal(directory.name)
+        for index in range(3):
+            self.journal.append('Alpha', time(), {'moisture': index}, {})
+        self.journal.append('Removed', time(), {'moisture': 50}, {})
+
+    def daemon(self, acknowledged):
+        instance = Daemon.__new__(Daemon)
+        instance.settings = SimpleNamespace(mqtt_timeout=10, retry_backoff=15, probe_period=1800)
+        instance.flores = OrderedDict([('Alpha', dict())])
+        instance.mqtt = Connection(acknowledged)
+        instance.reporter = Reporter(instance.mqtt)
+        instance.journal = self.journal
+        instance.journal_replay_time = 0
+        instance.journal_failures = 0
+        return instance
+
+    def test_replay(self):
+        instance = self.daemon(acknowledged=True)
+        self.assertFalse(instance.journal_replay())
+        # Published with QoS 1 at least, readings of sensors removed from the configuration are dropped
+        self.assertEqual(instance.reporter.published, [('Alpha', {'moisture': index}, True, 1) for index in range(3)])
+        self.assertEqual(instance.mqtt.min_qos, 0)
+        self.assertEqual(self.journal.oldest(), [])
+
+    def test_not_acknowledged(self):
+        instance = self.daemon(acknowledged=False)
+        self.assertTrue(instance.journal_replay())
+        self.assertEqual(len(self.journal.oldest()), 4)
+        # Backoff doubling with every timeout
+        first = instance.journal_replay_time - time()
+        self.assertAlmostEqual(first, 15, delta=1)
+        instance.journal_replay()
+        self.assertAlmostEqual(instance.journal_replay_time - time(), 30, delta=1)
+        instance.mqtt.acknowledged = True
+        self.assertFalse(instance.journal_replay())
+        self.assertEqual(instance.journal_failures, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
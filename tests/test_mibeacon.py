@@ -0,0 +1,60 @@
+import unittest
+
+from miflora.miflora_poller import MI_BATTERY, MI_CONDUCTIVITY, MI_LIGHT, MI_MOISTURE, MI_TEMPERATURE
+
+from miflora_mqtt_daemon.mibeacon import decode_mibeacon
+
+# Service data of Mi Flora (HHCCJCY01) advertisements: frame control 0x2071, product id 0x0098, frame counter,
+# MAC address C4:7C:8D:6A:3E:7B in reverse byte order, capability 0x0d and one object
+HEADER = bytes.fromhex('71209800a3' '7b3e6a8d7cc4' '0d')
+MAC = 'C4:7C:8D:6A:3E:7B'
+
+
+class DecodeMiBeaconTest(unittest.TestCase):
+    def test_temperature(self):
+        self.assertEqual(decode_mibeacon(HEADER + bytes.fromhex('041002f300')), (MAC, {MI_TEMPERATURE: 24.3}))
+
+    def test_negative_temperature(self):
+        self.assertEqual(decode_mibeacon(HEADER + bytes.fromhex('0410029cff')), (MAC, {MI_TEMPERATURE: -10.0}))
+
+    def test_light(self):
+        self.assertEqual(decode_mibeacon(HEADER + bytes.fromhex('071003a08601')), (MAC, {MI_LIGHT: 100000}))
+
+    def test_moisture(self):
+        self.assertEqual(decode_mibeacon(HEADER + bytes.fromhex('0810012b')), (MAC, {MI_MOISTURE: 43}))
+
+    def test_conductivity(self):
+        self.assertEqual(decode_mibeacon(HEADER + bytes.fromhex('0910025e02')), (MAC, {MI_CONDUCTIVITY: 606}))
+
+    def test_battery(self):
+        self.assertEqual(decode_mibeacon(HEADER + bytes.fromhex('0a10015d')), (MAC, {MI_BATTERY: 93}))
+
+    def test_unknown_object_is_skipped(self):
+        self.assertEqual(decode_mibeacon(HEADER + bytes.fromhex('061002e801')), (MAC, {}))
+
+    def test_without_object(self):
+        # Frame control 0x2031, the sensor only announces its MAC address and capability
+        self.assertEqual(decode_mibeacon(bytes.fromhex('31209800a3' '7b3e6a8d7cc4' '0d')), (MAC, {}))
+
+    def test_without_mac_and_capability(self):
+        self.assertEqual(decode_mibeacon(bytes.fromhex('40209800a3' '0810012b')), (None, {MI_MOISTURE: 43}))
+
+    def test_io_capability(self):
+        frame = bytes.fromhex('71209800a3' '7b3e6a8d7cc4' '2d0100' '0810012b')
+        self.assertEqual(decode_mibeacon(frame), (MAC, {MI_MOISTURE: 43}))
+
+    def test_truncated_frames(self):
+        frame = HEADER + bytes.fromhex('041002f300')
+        for length in range(len(frame)):
+            with self.subTest(length=length), self.assertRaises(ValueError):
+                decode_mibeacon(frame[:length])
+
+    def test_encrypted_frame(self):
+        # Frame control 0x5858, the payload is followed by the frame counter extension and the message integrity check
+        frame = bytes.fromhex('58585b05a1' '7b3e6a8d7cc4' '8b5a73c1de' '000000' 'a43b7c12')
+        with self.assertRaisesRegex(ValueError, 'Encrypted'):
+            decode_mibeacon(frame)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from unittest import mock
+
+from miflora.miflora_poller import MI_MOISTURE, MI_TEMPERATURE
+
+from miflora_mqtt_daemon.scanning import AdvertisementIndex
+
+MAC = 'C4:7C:8D:6A:3E:7B'
+# MiBeacon frames of the sensor, see test_mibeacon.py
+TEMPERATURE_FRAME = bytes.fromhex('71209800a3' '7b3e6a8d7cc4' '0d' '041002f300')
+MOISTURE_FRAME = bytes.fromhex('71209800a3' '7b3e6a8d7cc4' '0d' '0810012b')
+
+
+class AdvertisementIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = AdvertisementIndex(max_age=300)
+        self.now = 10000
+        patcher = mock.patch('miflora_mqtt_daemon.scanning.time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def advertise(self, rssi, adapter='hci0', frame=MOISTURE_FRAME, mac=MAC):
+        self.index.on_advertisement(mac, rssi, frame, adapter)
+
+    def test_untracked_sensor_is_ignored(self):
+        self.advertise(-60)
+        self.assertEqual(self.index.strongest_sighting(MAC, ['hci0']), (None, None))
+        self.assertIsNone(self.index.last_seen(MAC, ['hci0']))
+
+    def test_rssi_is_smoothed(self):
+        self.index.track(MAC.lower(), False)
+        self.advertise(-60)
+        self.assertEqual(self.index.strongest_sighting(MAC, ['hci0']), ('hci0', -60))
+        self.now += 10
+        self.advertise(-80)
+        self.assertEqual(self.index.strongest_sighting(MAC, ['hci0']), ('hci0', -66))
+
+    def test_smoothing_restarts_after_max_age(self):
+        self.index.track(MAC, False)
+        self.advertise(-60)
+        self.now += 301
+        self.assertEqual(self.index.strongest_sighting(MAC, ['hci0']), (None, None))
+        self.advertise(-80)
+        self.assertEqual(self.index.strongest_sighting(MAC, ['hci0']), ('hci0', -80))
+
+    def test_strongest_sighting(self):
+        self.index.track(MAC, False)
+        self.advertise(-70, adapter='hci0')
+        self.advertise(-55, adapter='hci1')
+        self.advertise(-40, adapter='hci2')
+        self.assertEqual(self.index.strongest_sighting(MAC, ['hci0', 'hci1']), ('hci1', -55))
+        self.assertEqual(self.index.strongest_sighting(MAC, ['hci0']), ('hci0', -70))
+
+    def test_last_seen(self):
+        self.index.track(MAC, False)
+        self.advertise(-70, adapter='hci0')
+        self.now += 20
+        self.advertise(-70, adapter='hci1')
+        self.assertEqual(self.index.last_seen(MAC, ['hci0', 'hci1']), 10020)
+        self.assertEqual(self.index.last_seen(MAC, ['hci0']), 10000)
+        self.assertIsNone(self.index.last_seen(MAC, ['hci2']))
+
+    def test_received_values(self):
+        self.index.track(MAC, True)
+        self.advertise(-60, frame=TEMPERATURE_FRAME)
+        self.now += 5
+        self.advertise(-60, frame=MOISTURE_FRAME)
+        self.advertise(-60, frame=b'\x00')
+        self.assertEqual(self.index.received(MAC), {MI_TEMPERATURE: (24.3, 10000), MI_MOISTURE: (43, 10005)})
+
+    def test_values_not_kept_for_active_sensors(self):
+        self.index.track(MAC, False)
+        self.advertise(-60, frame=TEMPERATURE_FRAME)
+        with self.assertRaises(KeyError):
+            self.index.received(MAC)
+
+    def test_forget(self):
+        self.index.track(MAC, True)
+        self.advertise(-60)
+        self.index.forget(MAC.lower())
+        self.assertEqual(self.index.macs(), [])
+        self.assertIsNone(self.index.last_seen(MAC, ['hci0']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+from configparser import ConfigParser
+
+from miflora_mqtt_daemon.simulation import SimulatedBackend, simulated_values
+
+
+def configure(options):
+    config = ConfigParser()
+    config.read_string('[Simulation]\n' + options)
+    SimulatedBackend.configure(config['Simulation'])
+
+
+class SimulatedValuesTest(unittest.TestCase):
+    def tearDown(self):
+        configure('')
+
+    def test_global_values(self):
+        configure('moisture = 35\nlight = 100:200\n')
+        values = simulated_values('C4:7C:8D:00:00:01', 50000)
+        self.assertEqual(values['moisture'], 35)
+        self.assertTrue(100 <= values['light'] <= 200)
+
+    def test_sensor_values_override_global_values(self):
+        configure('moisture = 35\nsensors =\n    c4:7c:8d:00:00:01 moisture=10 battery=5:10\n')
+        values = simulated_values('C4:7C:8D:00:00:01', 50000)
+        self.assertEqual(values['moisture'], 10)
+        self.assertTrue(5 <= values['battery'] <= 10)
+        self.assertEqual(simulated_values('C4:7C:8D:00:00:02', 50000)['moisture'], 35)
+
+    def test_unknown_value(self):
+        with self.assertRaises(ValueError):
+            configure('sensors = C4:7C:8D:00:00:01 water=3\n')
+
+    def test_invalid_range(self):
+        with self.assertRaises(ValueError):
+            configure('moisture = 50:10\n')